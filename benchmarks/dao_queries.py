@@ -0,0 +1,260 @@
+"""
+Seeds a synthetic dataset and reports the query plans and timings of the DAO queries.
+
+Every DAO call is run through a connection that records the statements it executes, the recorded SELECT statements
+are run again with EXPLAIN. Plans that scan a whole table or sort/group through a temporary table are flagged.
+
+Run against a scratch database, configured like the app through the MYSQL_* environment variables:
+
+    python benchmarks/dao_queries.py --playlists 20 --scans 5 --tracks 2000
+    python benchmarks/dao_queries.py --cleanup
+"""
+import argparse
+import random
+import statistics
+import sys
+from datetime import datetime, timedelta
+from os import path
+from time import perf_counter
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+from spotify import database
+from spotify.album import Album
+from spotify.artist import Artist
+from spotify.playlist import Playlist
+from spotify.playlist_scan import PlaylistScan
+from spotify.track import Track
+from spotify.user import User
+
+# Prefix of every id the benchmark creates, so its data can be told apart and removed
+ID_PREFIX = "bench_"
+
+
+class RecordingCursor:
+    def __init__(self, cursor, statements: list):
+        self.__cursor = cursor
+        self.__statements = statements
+
+    def execute(self, query, params=None, *args, **kwargs):
+        self.__statements.append((query, params))
+        return self.__cursor.execute(query, params, *args, **kwargs)
+
+    def executemany(self, query, seq_params, *args, **kwargs):
+        self.__statements.append((query, None))
+        return self.__cursor.executemany(query, seq_params, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.__cursor, name)
+
+
+class RecordingConnection:
+    def __init__(self, connection):
+        """Wraps a connection, recording every statement executed on its cursors."""
+        self.__connection = connection
+        self.statements = []
+
+    def cursor(self, *args, **kwargs):
+        return RecordingCursor(self.__connection.cursor(*args, **kwargs), self.statements)
+
+    def __getattr__(self, name):
+        return getattr(self.__connection, name)
+
+
+def seed(daos: database.DAOs, playlists: int, scans: int, tracks: int, track_pool: int):
+    """Stores scans of synthetic playlists, drawing their tracks from a shared pool so scans overlap."""
+    rng = random.Random(42)
+    start_date = datetime(2020, 1, 1)
+
+    artists = [Artist(f"{ID_PREFIX}artist_{i}", f"Artist {i}") for i in range(max(1, track_pool // 10))]
+    albums = [Album(f"{ID_PREFIX}album_{i}", f"Album {i}", 1960 + i % 60) for i in range(max(1, track_pool // 8))]
+    pool = [
+        Track(f"{ID_PREFIX}track_{i}", f"Track {i}", rng.choice(albums), rng.sample(artists, min(len(artists), rng.randint(1, 3))))
+        for i in range(track_pool)
+    ]
+
+    user = User(f"{ID_PREFIX}user", "Benchmark", None, datetime.now(), datetime.now())
+
+    for playlist_index in range(playlists):
+        playlist = Playlist(f"{ID_PREFIX}playlist_{playlist_index}", f"Playlist {playlist_index}", "https://example.com/cover.png")
+
+        for scan_index in range(scans):
+            scan_tracks = []
+            for track in rng.sample(pool, min(tracks, len(pool))):
+                scan_tracks.append(Track(track.id, track.title, track.album, track.artists,
+                                         added_at = start_date + timedelta(minutes = rng.randint(0, 60 * 24 * 365 * 4))))
+
+            playlist_scan = PlaylistScan(playlist = playlist, requested_by_user = user,
+                                         export_completed = scan_index % 2 == 0, tracks = scan_tracks)
+
+            start_time = perf_counter()
+            daos.playlist_scan_dao.put_instance(playlist_scan)
+            print(f"Stored scan {scan_index + 1}/{scans} of playlist {playlist_index + 1}/{playlists}: "
+                  f"{len(scan_tracks)} tracks in {perf_counter() - start_time:.2f}s")
+
+
+def cleanup(connection, prefix: str = ID_PREFIX):
+    """
+    Removes the benchmark data, the scans and their links are removed with the playlists by cascade.
+    :param prefix: The prefix of the ids to remove, shared by the benchmarks that store their own data.
+    """
+    cursor = connection.cursor()
+    try:
+        for table in ("playlist", "user", "track", "album", "artist"):
+            cursor.execute(f"DELETE FROM {table} WHERE id LIKE %s", (f"{prefix}%",))
+        connection.commit()
+    finally:
+        cursor.close()
+
+
+def get_benchmark_cases(daos: database.DAOs, connection) -> list[tuple[str, callable]]:
+    """The DAO calls to measure, on scans and tracks of the seeded data."""
+    cursor = connection.cursor(dictionary = True)
+    try:
+        cursor.execute("""
+            SELECT ps.id, ps.playlist_id, ps.timestamp
+            FROM playlist_scan ps
+            WHERE ps.playlist_id LIKE %s
+            ORDER BY ps.timestamp DESC
+            LIMIT 2
+        """, (f"{ID_PREFIX}%",))
+        scans = cursor.fetchall()
+        if not scans:
+            raise RuntimeError("No benchmark data found, run with --seed first")
+
+        cursor.execute("SELECT id FROM track WHERE id LIKE %s LIMIT 500", (f"{ID_PREFIX}%",))
+        track_ids = [row["id"] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+    scan = scans[0]
+    older_scan = scans[-1]
+    newer_than = datetime(2022, 1, 1)
+    playlist_scan_dao = daos.playlist_scan_dao
+
+    return [
+        ("PlaylistScanDAO.get_instance", lambda: playlist_scan_dao.get_instance(scan["id"])),
+        ("PlaylistScanDAO.get_instance (unique, newer than)",
+         lambda: playlist_scan_dao.get_instance(scan["id"], True, newer_than)),
+        ("PlaylistScanDAO.get_attributes",
+         lambda: playlist_scan_dao.get_attributes(scan["id"], ('p.title', 'p.id AS playlist_id', 'ps.export_completed'))),
+        ("PlaylistScanDAO.get_available_scans_to_extend_from",
+         lambda: playlist_scan_dao.get_available_scans_to_extend_from(scan["playlist_id"])),
+        ("PlaylistScanDAO.get_track_attributes",
+         lambda: playlist_scan_dao.get_track_attributes(scan["id"], ('COUNT(track_id) AS amount_of_tracks',))),
+        ("PlaylistScanDAO.get_track_attributes (unique, newer than)",
+         lambda: playlist_scan_dao.get_track_attributes(scan["id"], ('COUNT(DISTINCT track_id) AS amount',), newer_than)),
+        ("PlaylistScanDAO.get_statistics", lambda: playlist_scan_dao.get_statistics(scan["id"])),
+        ("PlaylistScanDAO.get_statistics (newer than scan)",
+         lambda: playlist_scan_dao.get_statistics(scan["id"], older_scan["id"])),
+        ("PlaylistScanDAO.get_details", lambda: playlist_scan_dao.get_details(scan["id"])),
+        ("PlaylistScanDAO.get_details (newer than scan)",
+         lambda: playlist_scan_dao.get_details(scan["id"], older_scan["id"])),
+        ("PlaylistScanDAO.get_latest_instance", lambda: playlist_scan_dao.get_latest_instance(scan["playlist_id"])),
+        ("PlaylistScanDAO.get_scan_chain", lambda: playlist_scan_dao.get_scan_chain(scan["id"])),
+        ("PlaylistScanDAO.get_track_ids", lambda: playlist_scan_dao.get_track_ids(scan["id"])),
+        ("PlaylistDAO.get_instance_from_scan", lambda: daos.playlist_dao.get_instance_from_scan(scan["id"])),
+        ("TrackDAO.get_instance", lambda: daos.track_dao.get_instance(track_ids[0])),
+        ("TrackDAO.get_instances (500)", lambda: daos.track_dao.get_instances(track_ids)),
+        ("UserDAO.get_instance", lambda: daos.user_dao.get_instance(f"{ID_PREFIX}user")),
+    ]
+
+
+def explain(connection, query: str, params) -> list[dict]:
+    cursor = connection.cursor(dictionary = True)
+    try:
+        cursor.execute(f"EXPLAIN {query}", params)
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+def get_plan_warnings(plan: list[dict]) -> list[str]:
+    """Flags full table scans and sorts or groupings through a temporary table."""
+    warnings = []
+    for row in plan:
+        table = row.get("table")
+        extra = row.get("Extra") or ""
+        if row.get("type") == "ALL" and not str(table).startswith("<"):
+            warnings.append(f"full scan of {table} ({row.get('rows')} rows)")
+        if "Using filesort" in extra:
+            warnings.append(f"filesort on {table}")
+        if "Using temporary" in extra:
+            warnings.append(f"temporary table on {table}")
+    return warnings
+
+
+def run(repeat: int, show_plans: bool) -> int:
+    connection = database.get_connection()
+    try:
+        recording_connection = RecordingConnection(connection)
+        daos = database.DAOs(recording_connection)
+
+        flagged = 0
+        for name, call in get_benchmark_cases(daos, connection):
+            runtimes = []
+            for _ in range(repeat):
+                recording_connection.statements.clear()
+                start_time = perf_counter()
+                call()
+                runtimes.append((perf_counter() - start_time) * 1000)
+
+            statements = list(recording_connection.statements)
+            runtimes.sort()
+            print(f"\n{name}: median {statistics.median(runtimes):.2f}ms, "
+                  f"p95 {runtimes[int(len(runtimes) * 0.95) - 1 if len(runtimes) > 1 else 0]:.2f}ms, "
+                  f"{len(statements)} statements per call")
+
+            # Explain every distinct read statement of the call
+            explained = set()
+            for query, params in statements:
+                if not query.lstrip().upper().startswith("SELECT") or query in explained:
+                    continue
+                explained.add(query)
+
+                plan = explain(connection, query, params)
+                warnings = get_plan_warnings(plan)
+                flagged += bool(warnings)
+                if show_plans or warnings:
+                    print("   " + " ".join(query.split())[:160])
+                    for row in plan:
+                        print(f"      {row.get('table')}: type={row.get('type')} key={row.get('key')} "
+                              f"rows={row.get('rows')} extra={row.get('Extra')}")
+                for warning in warnings:
+                    print(f"      WARNING: {warning}")
+
+        print(f"\n{flagged} statements with a flagged plan")
+        return flagged
+    finally:
+        connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", action = "store_true", help = "Store a synthetic dataset before measuring")
+    parser.add_argument("--cleanup", action = "store_true", help = "Remove the synthetic dataset and exit")
+    parser.add_argument("--playlists", type = int, default = 20)
+    parser.add_argument("--scans", type = int, default = 5, help = "Scans per playlist")
+    parser.add_argument("--tracks", type = int, default = 2000, help = "Tracks per scan")
+    parser.add_argument("--track-pool", type = int, default = 20000, help = "Distinct tracks the scans draw from")
+    parser.add_argument("--repeat", type = int, default = 20, help = "Runs per DAO call")
+    parser.add_argument("--plans", action = "store_true", help = "Print every plan, not only the flagged ones")
+    parser.add_argument("--strict", action = "store_true", help = "Exit with an error when a plan is flagged")
+    arguments = parser.parse_args()
+
+    if arguments.cleanup:
+        with database.connect() as daos:
+            cleanup(daos.connection)
+        return
+
+    if arguments.seed:
+        with database.connect() as daos:
+            seed(daos, arguments.playlists, arguments.scans, arguments.tracks, arguments.track_pool)
+
+    flagged = run(arguments.repeat, arguments.plans)
+    if arguments.strict and flagged:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
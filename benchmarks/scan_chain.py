@@ -0,0 +1,116 @@
+"""
+Measures loading the latest scan of chains of delta scans of growing depth.
+
+For every depth a full scan is stored, followed by that many delta scans each adding a few tracks. Loading the latest
+scan, its track ids and its track counts should take the same amount of statements at every depth, and a time growing
+with the amount of tracks only, not with the amount of scans in the chain.
+
+Run against a scratch database, configured like the app through the MYSQL_* environment variables:
+
+    python benchmarks/scan_chain.py --depths 1 5 20 50 --base-tracks 500 --delta-tracks 10
+"""
+import argparse
+import statistics
+import sys
+from datetime import datetime, timedelta
+from os import path
+from time import perf_counter
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+from benchmarks.dao_queries import RecordingConnection, cleanup
+from spotify import database
+from spotify.album import Album
+from spotify.artist import Artist
+from spotify.playlist import Playlist
+from spotify.playlist_scan import PlaylistScan
+from spotify.track import Track
+from spotify.user import User
+
+# Prefix of every id the benchmark creates, so its data can be told apart and removed
+ID_PREFIX = "bench_chain_"
+
+
+def seed_chain(daos: database.DAOs, depth: int, base_tracks: int, delta_tracks: int, user: User) -> str:
+    """Stores a full scan followed by depth delta scans of one playlist, returning the id of the latest scan."""
+    playlist = Playlist(f"{ID_PREFIX}playlist_{depth}", f"Chain of {depth}", "https://example.com/cover.png")
+    artist = Artist(f"{ID_PREFIX}artist", "Artist")
+    album = Album(f"{ID_PREFIX}album", "Album", 2000)
+    start_date = datetime(2020, 1, 1)
+
+    def build_tracks(first: int, amount: int) -> list[Track]:
+        return [Track(f"{ID_PREFIX}track_{i}", f"Track {i}", album, [artist],
+                      added_at = start_date + timedelta(hours = i)) for i in range(first, first + amount)]
+
+    playlist_scan = PlaylistScan(playlist = playlist, requested_by_user = user, export_completed = True,
+                                 tracks = build_tracks(0, base_tracks))
+    daos.playlist_scan_dao.put_instance(playlist_scan)
+
+    for delta_index in range(depth):
+        playlist_scan = PlaylistScan(playlist = playlist, requested_by_user = user, export_completed = True,
+                                     tracks = build_tracks(base_tracks + delta_index * delta_tracks, delta_tracks),
+                                     extends_playlist_scan = playlist_scan, delta_scan = True)
+        daos.playlist_scan_dao.put_instance(playlist_scan)
+
+    return playlist_scan.id
+
+
+def measure(recording_connection: RecordingConnection, call, repeat: int) -> tuple[float, int]:
+    """:return: The median runtime in milliseconds and the amount of statements of one call."""
+    runtimes = []
+    for _ in range(repeat):
+        recording_connection.statements.clear()
+        start_time = perf_counter()
+        call()
+        runtimes.append((perf_counter() - start_time) * 1000)
+    return statistics.median(runtimes), len(recording_connection.statements)
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--depths", type = int, nargs = "+", default = [1, 5, 20, 50],
+                        help = "Amounts of delta scans on top of the full scan")
+    parser.add_argument("--base-tracks", type = int, default = 500, help = "Tracks of the full scan")
+    parser.add_argument("--delta-tracks", type = int, default = 10, help = "Tracks added by every delta scan")
+    parser.add_argument("--repeat", type = int, default = 10, help = "Runs per measured call")
+    parser.add_argument("--keep", action = "store_true", help = "Keep the stored data instead of removing it")
+    arguments = parser.parse_args()
+
+    user = User(f"{ID_PREFIX}user", "Benchmark", None, datetime.now(), datetime.now())
+    with database.connect() as daos:
+        cleanup(daos.connection, ID_PREFIX)
+        latest_scan_ids = {depth: seed_chain(daos, depth, arguments.base_tracks, arguments.delta_tracks, user)
+                           for depth in arguments.depths}
+
+    connection = database.get_connection()
+    try:
+        recording_connection = RecordingConnection(connection)
+
+        print(f"{'depth':>6} {'tracks':>7} {'call':<26} {'median':>10} {'statements':>11}")
+        for depth, playlist_scan_id in latest_scan_ids.items():
+            # A fresh bundle per depth, so the identity map does not carry tracks over from a smaller chain
+            daos = database.DAOs(recording_connection)
+            playlist_scan_dao = daos.playlist_scan_dao
+            amount_of_tracks = arguments.base_tracks + depth * arguments.delta_tracks
+
+            calls = [
+                ("get_instance + all tracks",
+                 lambda: playlist_scan_dao.get_instance(playlist_scan_id).get_all_tracks()),
+                ("get_track_ids", lambda: playlist_scan_dao.get_track_ids(playlist_scan_id)),
+                ("get_scan_chain", lambda: playlist_scan_dao.get_scan_chain(playlist_scan_id)),
+                ("get_track_attributes",
+                 lambda: playlist_scan_dao.get_track_attributes(playlist_scan_id, ('COUNT(track_id) AS amount',))),
+            ]
+            for name, call in calls:
+                runtime, amount_of_statements = measure(recording_connection, call, arguments.repeat)
+                print(f"{depth:>6} {amount_of_tracks:>7} {name:<26} {runtime:>8.2f}ms {amount_of_statements:>11}")
+    finally:
+        connection.close()
+
+    if not arguments.keep:
+        with database.connect() as daos:
+            cleanup(daos.connection, ID_PREFIX)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Stores scans from many threads at once and checks every scan got its own id.
+
+Each thread stores scans of its own playlist, through its own pooled connection like a Celery worker would, and checks
+the id put_instance returned is stored and points at a scan of that playlist. Duplicate, missing or crossed ids are
+reported and make the run fail.
+
+Run against a scratch database, configured like the app through the MYSQL_* environment variables:
+
+    python benchmarks/scan_id_stress.py --threads 16 --scans 25 --tracks 20
+"""
+import argparse
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from os import path
+from time import perf_counter
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+from benchmarks.dao_queries import cleanup
+from spotify import database
+from spotify.album import Album
+from spotify.artist import Artist
+from spotify.playlist import Playlist
+from spotify.playlist_scan import PlaylistScan
+from spotify.track import Track
+from spotify.user import User
+
+# Prefix of every id the stress test creates, so its data can be told apart and removed
+ID_PREFIX = "bench_stress_"
+
+
+def store_scans(thread_index: int, scans: int, tracks: list[Track], user: User, start: threading.Barrier) -> list:
+    """Stores the scans of the playlist of one thread, returning the (playlist id, returned scan id) pairs."""
+    playlist = Playlist(f"{ID_PREFIX}playlist_{thread_index}", f"Playlist {thread_index}", "https://example.com/cover.png")
+    stored = []
+
+    # Let all threads start at the same moment
+    start.wait()
+    with database.connect() as daos:
+        for _ in range(scans):
+            playlist_scan = PlaylistScan(playlist = playlist, requested_by_user = user, export_completed = False,
+                                         tracks = tracks)
+            stored.append((playlist.id, daos.playlist_scan_dao.put_instance(playlist_scan)))
+
+    return stored
+
+
+def verify(connection, stored: list) -> list[str]:
+    """Checks the returned ids are set, unique and stored as a scan of the playlist that inserted them."""
+    problems = []
+
+    scan_ids = [scan_id for _, scan_id in stored]
+    if None in scan_ids:
+        problems.append(f"{scan_ids.count(None)} scans returned no id")
+    duplicates = len(scan_ids) - len(set(scan_ids))
+    if duplicates:
+        problems.append(f"{duplicates} ids were returned more than once")
+
+    cursor = connection.cursor(dictionary = True)
+    try:
+        cursor.execute("SELECT id, playlist_id FROM playlist_scan WHERE playlist_id LIKE %s", (f"{ID_PREFIX}%",))
+        stored_playlists = {str(row['id']): row['playlist_id'] for row in cursor.fetchall()}
+    finally:
+        cursor.close()
+
+    if len(stored_playlists) != len(stored):
+        problems.append(f"{len(stored)} scans were stored, but {len(stored_playlists)} are in the database")
+
+    for playlist_id, scan_id in stored:
+        if scan_id is None:
+            continue
+        if scan_id not in stored_playlists:
+            problems.append(f"Scan {scan_id} of {playlist_id} is not in the database")
+        elif stored_playlists[scan_id] != playlist_id:
+            problems.append(f"Scan {scan_id} of {playlist_id} was stored for {stored_playlists[scan_id]}")
+
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type = int, default = 16, help = "Threads storing scans at the same time")
+    parser.add_argument("--scans", type = int, default = 25, help = "Scans stored per thread")
+    parser.add_argument("--tracks", type = int, default = 20, help = "Tracks per scan")
+    parser.add_argument("--keep", action = "store_true", help = "Keep the stored data instead of removing it")
+    arguments = parser.parse_args()
+
+    if arguments.threads > database.POOL_SIZE:
+        print(f"Warning: {arguments.threads} threads share {database.POOL_SIZE} pooled connections, "
+              f"set MYSQL_POOL_SIZE to let them all insert at once")
+
+    artist = Artist(f"{ID_PREFIX}artist", "Artist")
+    album = Album(f"{ID_PREFIX}album", "Album", 2000)
+    tracks = [Track(f"{ID_PREFIX}track_{i}", f"Track {i}", album, [artist], added_at = datetime(2020, 1, 1))
+              for i in range(arguments.tracks)]
+    user = User(f"{ID_PREFIX}user", "Stress test", None, datetime.now(), datetime.now())
+
+    # Store the shared entities up front, so the threads only race on the scans
+    with database.connect() as daos:
+        cleanup(daos.connection, ID_PREFIX)
+        daos.user_dao.put_instance(user)
+        daos.track_dao.put_instances(tracks)
+        daos.connection.commit()
+        daos.track_dao.identity_map.commit()
+
+    start = threading.Barrier(arguments.threads)
+    start_time = perf_counter()
+    with ThreadPoolExecutor(max_workers = arguments.threads) as executor:
+        futures = [executor.submit(store_scans, i, arguments.scans, tracks, user, start)
+                   for i in range(arguments.threads)]
+        stored = [pair for future in futures for pair in future.result()]
+    runtime = perf_counter() - start_time
+
+    with database.connect() as daos:
+        problems = verify(daos.connection, stored)
+        if not arguments.keep:
+            cleanup(daos.connection, ID_PREFIX)
+
+    print(f"Stored {len(stored)} scans from {arguments.threads} threads in {runtime:.2f}s "
+          f"({len(stored) / runtime:.1f} scans/s)")
+    for problem in problems:
+        print(f"   ERROR: {problem}")
+    if problems:
+        sys.exit(1)
+    print("Every scan got a unique id")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Measures the memory a scan of synthetic tracks takes, per track.
+
+The tracks are built like a scan from the Spotify API builds them, once with the slotted model with interned artists
+and albums, and once with a copy of the earlier dict-backed model that built an artist and album per track and the url
+up front. Needs no database.
+
+    python benchmarks/track_memory.py --tracks 50000 --artists 5000 --albums 8000
+"""
+import argparse
+import gc
+import random
+import sys
+import tracemalloc
+from datetime import datetime, timedelta
+from os import path
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+from spotify.album import Album
+from spotify.artist import Artist
+from spotify.track import Track
+
+
+class DictArtist:
+    def __init__(self, artist_id: str, name: str):
+        self.id = artist_id
+        self.name = name
+
+
+class DictAlbum:
+    def __init__(self, album_id: str, title: str, release_year: int):
+        self.id = album_id
+        self.title = title
+        self.release_year = release_year
+
+
+class DictTrack:
+    def __init__(self, track_id: str, title: str, album: DictAlbum, artists: list[DictArtist], added_at: datetime = None):
+        self.id = track_id
+        self.url = f"https://open.spotify.com/track/{self.id}"
+        self.title = title
+        self.album = album
+        self.artists = artists
+        self.added_at = added_at
+
+
+def build_items(tracks: int, artists: int, albums: int) -> list[dict]:
+    """Playlist items shaped like the ones of the Spotify API, drawing from a limited amount of artists and albums."""
+    rng = random.Random(42)
+    start_date = datetime(2020, 1, 1)
+
+    items = []
+    for i in range(tracks):
+        album_index = rng.randrange(albums)
+        items.append({
+            'id': f"track_{i:022d}",
+            'name': f"Track {i}",
+            'album': (f"album_{album_index:022d}", f"Album {album_index}", 1960 + album_index % 60),
+            'artists': [(f"artist_{index:022d}", f"Artist {index}") for index in rng.sample(range(artists), rng.randint(1, 3))],
+            'added_at': start_date + timedelta(minutes = i)
+        })
+    return items
+
+
+def build_slotted(items: list[dict]) -> list[Track]:
+    return [
+        Track(item['id'], item['name'], Album.intern(*item['album']),
+              [Artist.intern(*artist) for artist in item['artists']], item['added_at'])
+        for item in items
+    ]
+
+
+def build_dict_backed(items: list[dict]) -> list[DictTrack]:
+    return [
+        DictTrack(item['id'], item['name'], DictAlbum(*item['album']),
+                  [DictArtist(*artist) for artist in item['artists']], item['added_at'])
+        for item in items
+    ]
+
+
+def measure(build, items: list[dict]) -> int:
+    """:return: The bytes still allocated by the built tracks."""
+    gc.collect()
+    tracemalloc.start()
+    tracks = build(items)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del tracks
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tracks", type = int, default = 50000)
+    parser.add_argument("--artists", type = int, default = 5000, help = "Distinct artists the tracks draw from")
+    parser.add_argument("--albums", type = int, default = 8000, help = "Distinct albums the tracks draw from")
+    arguments = parser.parse_args()
+
+    items = build_items(arguments.tracks, arguments.artists, arguments.albums)
+
+    dict_backed = measure(build_dict_backed, items)
+    slotted = measure(build_slotted, items)
+
+    print(f"{arguments.tracks} tracks, {arguments.artists} artists, {arguments.albums} albums")
+    print(f"   dict-backed: {dict_backed / arguments.tracks:8.0f} bytes per track ({dict_backed / 2 ** 20:.1f} MiB)")
+    print(f"   slotted:     {slotted / arguments.tracks:8.0f} bytes per track ({slotted / 2 ** 20:.1f} MiB)")
+    print(f"   saved:       {1 - slotted / dict_backed:8.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,7 @@ from .media_control import media_control_bp
 from .config import Config
 import os
 from celery import Celery, Task
+from spotify import database, identity
 
 
 def make_celery(app: Flask) -> Celery:
@@ -40,6 +41,15 @@ def create_app():
     app.register_blueprint(scan_bp, url_prefix='/scan')
     app.register_blueprint(media_control_bp, url_prefix='/media-control')
 
+    @app.route('/metrics/database')
+    def database_metrics():
+        # Connection pool wait metrics and identity map hit ratios of this (web) process
+        return {
+            **database.metrics.export_attributes(),
+            'identity_map': identity.metrics.export_attributes(),
+            'known_ids': identity.known_ids.stats()
+        }
+
     return app
 
 
@@ -18,7 +18,7 @@ def callback():
     auth_obj = spotify.api.Authenticate(request.args.get('code'))
     user = auth_obj.get_user()
     session['access_token'] = auth_obj.get_access_token()
-    session['user_vars'] = vars(user)
+    session['user_vars'] = user.export_attributes()
 
     # Retrieve the 'state' parameter for redirection
     next_url = request.args.get('state', '/')
@@ -0,0 +1,46 @@
+import threading
+from collections import OrderedDict
+from time import monotonic
+
+
+class TTLCache:
+    def __init__(self, ttl: float, max_entries: int):
+        """
+        In-memory cache of the entries of the last ttl seconds, bounded to max_entries (least recently used first out).
+        Safe to share between the threads of a process.
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, key):
+        """:return: The cached value, or None if it is not cached or expired."""
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None or entry[0] < monotonic():
+                self.misses += 1
+                return None
+
+            self.__entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self.__lock:
+            self.__entries[key] = (monotonic() + self.ttl, value)
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.max_entries:
+                self.__entries.popitem(last = False)
+
+    def stats(self) -> dict:
+        with self.__lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.__entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0
+            }
@@ -3,4 +3,5 @@ from flask import Blueprint
 export_bp = Blueprint('export', __name__)
 
 from . import routes
-from . import functions
\ No newline at end of file
+from . import functions
+from . import commands
\ No newline at end of file
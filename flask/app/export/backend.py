@@ -1,4 +1,13 @@
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import timedelta
+from functools import lru_cache
+from io import BytesIO
+from itertools import islice
+from os import environ, cpu_count, getpid, path, remove
 from time import time
 from fpdf import FPDF
 from spotify import Track
@@ -6,8 +15,50 @@ from PIL import Image, ImageDraw, ImageFont
 import qrcode
 import math
 
+from .cache import DiskCache
+from .progress import CancellationWatcher, RunningEstimate
+from .writer import StreamingPDFWriter
+
+# Amount of processes rendering the card images, shared by all the exports of a worker process.
+# 1 renders them in the exporting process itself
+RENDER_PROCESSES = int(environ.get("PDF_RENDER_PROCESSES", cpu_count() or 1))
+
+# Persistent cache of QR code module matrices, shared by all exports
+QR_CACHE_DIR = environ.get("QR_CACHE_DIR", "/data/cache/qr")
+QR_CACHE_MAX_BYTES = int(environ.get("QR_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+# Persistent cache of rendered label images, shared by all exports of all scans
+CARD_CACHE_DIR = environ.get("CARD_CACHE_DIR", "/data/cache/cards")
+CARD_CACHE_MAX_BYTES = int(environ.get("CARD_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+
+# Smallest font size before text gets wrapped
+MIN_FONT_SIZE = 30
+
+
+@lru_cache(maxsize = 256)
+def load_font(font_path: str, size: int) -> ImageFont.FreeTypeFont:
+    """Loads a font once per process for every (path, size)."""
+    return ImageFont.truetype(font_path, size)
+
+
+@lru_cache(maxsize = 16384)
+def measure_text(font_path: str, size: int, text: str) -> int:
+    """Memoized right edge of the bounding box of the text."""
+    return load_font(font_path, size).getbbox(text)[2]
+
+
+@lru_cache(maxsize = 16384)
+def measure_text_length(font_path: str, size: int, text: str) -> float:
+    """Memoized advance length of the text, as ImageDraw.textlength measures it on an RGB image."""
+    return load_font(font_path, size).getlength(text, "L")
+
 
 class TrackLabel:
+    img_size = 800  # Size of the square label image in pixels
+    layout_version = 1  # Bump when the layout changes, so cached label images are not reused
+
+    cache = DiskCache(CARD_CACHE_DIR, CARD_CACHE_MAX_BYTES)
+
     def __init__(self, track: Track, style=None):
         self.track = track
         self.track_info = {
@@ -19,31 +70,46 @@ class TrackLabel:
             'font_path': 'Arial.ttf'
         }
 
+        # Whether export_cached found the label image in the card cache
+        self.cache_hit = False
+
     @staticmethod
     def __adjust_font_size(text, max_width, base_font_size, font_path):
         """Adjust the font size to make the text fit within the max_width."""
-        font_size = base_font_size
-        font = ImageFont.truetype(font_path, font_size)
-        while font.getbbox(text)[2] > max_width and font_size > 30:  # 30 is the minimum size before wrapping
-            font_size -= 2
-            font = ImageFont.truetype(font_path, font_size)
-        return font, font_size
+        # Candidate sizes in steps of 2, down to the first size at or below the minimum size before wrapping
+        font_sizes = [base_font_size]
+        while font_sizes[-1] > MIN_FONT_SIZE:
+            font_sizes.append(font_sizes[-1] - 2)
+
+        # Binary search for the largest size that fits, the text width shrinks along with the font size
+        low, high = 0, len(font_sizes) - 1
+        while low < high:
+            middle = (low + high) // 2
+            if measure_text(font_path, font_sizes[middle], text) <= max_width:
+                high = middle
+            else:
+                low = middle + 1
+
+        font_size = font_sizes[low]
+        return load_font(font_path, font_size), font_size
 
     @staticmethod
+    @lru_cache(maxsize = 4096)
     def __adjust_font_size_and_wrap(text, max_width, base_font_size, font_path):
         """First, try resizing, then apply wrapping if the font size is too small."""
         # Step 1: Resize text
         font, font_size = TrackLabel.__adjust_font_size(text, max_width, base_font_size, font_path)
 
         # Step 2: If font size is too small, apply wrapping
-        if font_size <= 30:
+        if font_size <= MIN_FONT_SIZE:
             # Use wrapping if the text still doesn't fit at a reasonable font size
             wrapped_lines = TrackLabel.__wrap_text(text, font, max_width)
         else:
             # Otherwise, keep the text in a single line
             wrapped_lines = [text]
 
-        return font, wrapped_lines
+        # Memoized, so return an immutable result
+        return font, tuple(wrapped_lines)
 
     @staticmethod
     def __wrap_text(text, font, max_width):
@@ -54,7 +120,7 @@ class TrackLabel:
 
         for word in words:
             current_line.append(word)
-            if font.getbbox(' '.join(current_line))[2] > max_width:
+            if measure_text(font.path, font.size, ' '.join(current_line)) > max_width:
                 current_line.pop()  # Remove the last word that caused overflow
                 lines.append(' '.join(current_line))
                 current_line = [word]  # Start a new line with the overflow word
@@ -62,23 +128,26 @@ class TrackLabel:
         lines.append(' '.join(current_line))  # Add the last line
         return lines
 
-    def export(self) -> Image:
+    def layout(self) -> list[tuple[str, float, float, int]]:
+        """
+        Positions the text of the label on a square canvas of img_size pixels.
+        :return: The (text, x, y, font_size) of every line, x/y being the left/top (ascender) of the text in pixels.
+        """
         # Higher resolution and square box with built-in margins
-        img_size = 800
+        img_size = TrackLabel.img_size
         margin = 80  # Margin size for cutting
         max_text_width = img_size - 2 * margin
-        image = Image.new("RGB", (img_size, img_size), "white")
-        draw = ImageDraw.Draw(image)
+        lines = []
 
         # Load fonts
         font_path = self.style['font_path']  # Adjust to the correct path to your font file
         base_font_size = 80
-        large_font = ImageFont.truetype(font_path, 160)
+        large_font = load_font(font_path, 160)
 
         # Adjust the date font
         date_text = self.track_info['date']
         date_font = large_font
-        date_width = draw.textlength(date_text, font = date_font)
+        date_width = measure_text_length(font_path, date_font.size, date_text)
         date_x = (img_size - date_width) // 2
         date_y = img_size // 2 - (date_font.size / 2)  # Center the date vertically
 
@@ -91,12 +160,12 @@ class TrackLabel:
         total_name_height = sum(name_font.size + 5 for _ in name_lines)
         name_y = date_y - total_name_height - 20  # Position above the date with some spacing
 
-        # Draw the title text, line by line
+        # Position the title text, line by line
         y_offset = name_y
         for line in name_lines:
-            line_width = draw.textlength(line, font = name_font)
+            line_width = measure_text_length(font_path, name_font.size, line)
             line_x = (img_size - line_width) // 2
-            draw.text((line_x, y_offset), line, fill = "black", font = name_font)
+            lines.append((line, line_x, y_offset, name_font.size))
             y_offset += name_font.size + 5  # Add some spacing between lines
 
         # Adjust the artist font size and wrap text if needed
@@ -106,39 +175,195 @@ class TrackLabel:
                                                                            artist_font_size,
                                                                            font_path)
 
-        # Draw the artist text, line by line, below the date
+        # Position the artist text, line by line, below the date
         y_offset = date_y + date_font.size + 20  # Position below the date with some spacing
         for line in artist_lines:
-            artist_width = draw.textlength(line, font = artist_font)
+            artist_width = measure_text_length(font_path, artist_font.size, line)
             artist_x = (img_size - artist_width) // 2
-            draw.text((artist_x, y_offset), line, fill = "black", font = artist_font)
+            lines.append((line, artist_x, y_offset, artist_font.size))
             y_offset += artist_font.size + 5  # Add some spacing between lines
 
-        # Draw the date text
-        draw.text((date_x, date_y), date_text, fill = "black", font = date_font)
+        # Position the date text
+        lines.append((date_text, date_x, date_y, date_font.size))
+
+        return lines
+
+    def export(self) -> Image:
+        image = Image.new("RGB", (TrackLabel.img_size, TrackLabel.img_size), "white")
+        draw = ImageDraw.Draw(image)
+
+        font_path = self.style['font_path']
+        for text, x, y, font_size in self.layout():
+            draw.text((x, y), text, fill = "black", font = load_font(font_path, font_size))
 
         # Save the image with built-in margins
         return image
 
+    def cache_key(self) -> str:
+        """Key of the label image in the card cache, built from the text, font and layout it depends on."""
+        return DiskCache.make_key(self.track_info['title'], self.track_info['artist'], self.track_info['date'],
+                                  self.style['font_path'], TrackLabel.img_size, TrackLabel.layout_version)
+
+    def export_cached(self) -> Image:
+        """Same as export, but reuses the label image of any earlier export with the same text, font and layout."""
+        key = self.cache_key()
+
+        data = TrackLabel.cache.get(key)
+        self.cache_hit = data is not None
+        if data is not None:
+            with Image.open(BytesIO(data)) as image:
+                return image.convert("RGB")
+
+        image = self.export()
+
+        buffer = BytesIO()
+        image.save(buffer, format = "PNG", compress_level = 1)
+        TrackLabel.cache.put(key, buffer.getvalue())
+        return image
+
 
 class QRCode:
+    # Settings of the QR code, part of the cache key of every matrix
+    version = 1  # Controls the size of the QR code
+    error_correction = qrcode.constants.ERROR_CORRECT_H  # High error correction
+    border = 4  # Border thickness (minimum value is 4)
+
+    cache = DiskCache(QR_CACHE_DIR, QR_CACHE_MAX_BYTES)
 
     @staticmethod
-    def generate(url: str) -> Image:
+    def __build(url: str) -> list[list[bool]]:
         # Create a QR code object with specific settings for higher resolution
         qr = qrcode.QRCode(
-            version = 1,  # Controls the size of the QR code
-            error_correction = qrcode.constants.ERROR_CORRECT_H,  # High error correction
-            box_size = 10,  # Size of each box in the QR code grid
-            border = 4  # Border thickness (minimum value is 4)
+            version = QRCode.version,
+            error_correction = QRCode.error_correction,
+            border = QRCode.border
         )
         qr.add_data(url)
         qr.make(fit = True)
+        return qr.get_matrix()
+
+    @staticmethod
+    def __encode_matrix(matrix: list[list[bool]]) -> bytes:
+        """Packs the square matrix into its size followed by one bit per module."""
+        bits = "".join("1" if dark else "0" for row in matrix for dark in row)
+        return len(matrix).to_bytes(2, "big") + int(bits, 2).to_bytes((len(bits) + 7) // 8, "big")
+
+    @staticmethod
+    def __decode_matrix(data: bytes) -> list[list[bool]]:
+        size = int.from_bytes(data[:2], "big")
+        bits = format(int.from_bytes(data[2:], "big"), f"0{size * size}b")
+        return [[bit == "1" for bit in bits[row * size:(row + 1) * size]] for row in range(size)]
 
-        # Create the QR code image
-        qr_image = qr.make_image(fill = "black", back_color = "white")
-        qr_image = qr_image.resize((800, 800), resample = Image.LANCZOS)  # Resize to match the track label size
-        return qr_image
+    @staticmethod
+    def matrix(url: str) -> list[list[bool]]:
+        """The modules of the QR code, including the border, True being a dark module."""
+        key = DiskCache.make_key(url, QRCode.version, QRCode.error_correction, QRCode.border)
+
+        data = QRCode.cache.get(key)
+        if data is not None:
+            return QRCode.__decode_matrix(data)
+
+        matrix = QRCode.__build(url)
+        QRCode.cache.put(key, QRCode.__encode_matrix(matrix))
+        return matrix
+
+    @staticmethod
+    def generate(url: str) -> Image:
+        matrix = QRCode.matrix(url)
+
+        # Create the QR code image, one pixel per module
+        qr_image = Image.new("1", (len(matrix), len(matrix)))
+        qr_image.putdata([0 if dark else 255 for row in matrix for dark in row])
+
+        # Resize to match the track label size, nearest neighbour like a bilevel image is always resized
+        return qr_image.resize((TrackLabel.img_size, TrackLabel.img_size), resample = Image.NEAREST)
+
+
+_render_pool = None
+_render_pool_pid = None
+_render_pool_lock = threading.Lock()
+
+
+def get_render_pool() -> ProcessPoolExecutor | None:
+    """
+    Returns the render process pool of this process, None when rendering in the process itself.
+    The pool is created lazily, recreated after a fork, and shared by every export the (threaded) worker runs, so the
+    amount of render processes stays at RENDER_PROCESSES however many exports run at once. Its processes are started
+    by a forkserver, forking the multithreaded worker could copy locks held by its other threads into the children.
+    """
+    global _render_pool, _render_pool_pid
+
+    if RENDER_PROCESSES <= 1:
+        return None
+
+    with _render_pool_lock:
+        if _render_pool is None or _render_pool_pid != getpid():
+            _render_pool = ProcessPoolExecutor(max_workers = RENDER_PROCESSES,
+                                               mp_context = multiprocessing.get_context("forkserver"))
+            _render_pool_pid = getpid()
+
+        return _render_pool
+
+
+def reset_render_pool(render_pool: ProcessPoolExecutor):
+    """Drops a render pool that can not be used anymore, the next export creates a new one."""
+    global _render_pool
+
+    with _render_pool_lock:
+        if _render_pool is render_pool:
+            _render_pool = None
+    render_pool.shutdown(wait = False, cancel_futures = True)
+
+
+def render_page(tracks: list[Track], style: dict, render_mode: str = "raster") -> tuple[list, list, bool]:
+    """
+    Renders the TrackLabels and QRCodes of the tracks on one page.
+    Module level so it can be sent to the render processes.
+    :return: The label images and QR code images, or in vector mode the label layouts and QR code matrices, and
+    whether all the labels were reused from the card cache (e.g. rendered by an earlier, stopped, export).
+    """
+    if render_mode == "vector":
+        label_layouts = [TrackLabel(track, style = style).layout() for track in tracks]
+        qr_code_matrices = [QRCode.matrix(track.url) for track in tracks]
+        return label_layouts, qr_code_matrices, False
+
+    track_labels = [TrackLabel(track, style = style) for track in tracks]
+    label_images = [track_label.export_cached() for track_label in track_labels]
+    reused = all(track_label.cache_hit for track_label in track_labels)
+
+    qr_code_images = [QRCode.generate(track.url) for track in tracks]
+    return label_images, qr_code_images, reused
+
+
+def warm_card_cache(tracks: list[Track], style: dict, processes: int = RENDER_PROCESSES) -> dict:
+    """
+    Renders the label images of the tracks into the card cache ahead of an export, using the render pool.
+    :return: The hit/miss stats of the card cache lookups.
+    """
+    # Split the tracks over the processes, every chunk reports the stats of its own process
+    render_pool = get_render_pool() if processes > 1 else None
+    chunks = [tracks[i::processes] for i in range(processes)] if render_pool is not None else [tracks]
+
+    if len(chunks) > 1:
+        chunk_stats = list(render_pool.map(warm_card_cache_chunk, chunks, [style] * len(chunks)))
+    else:
+        chunk_stats = [warm_card_cache_chunk(tracks, style)]
+
+    hits = sum(stats['hits'] for stats in chunk_stats)
+    misses = sum(stats['misses'] for stats in chunk_stats)
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / (hits + misses) if hits + misses else 0.0
+    }
+
+
+def warm_card_cache_chunk(tracks: list[Track], style: dict) -> dict:
+    hits, misses = TrackLabel.cache.hits, TrackLabel.cache.misses
+    for track in tracks:
+        TrackLabel(track, style = style).export_cached()
+
+    return {'hits': TrackLabel.cache.hits - hits, 'misses': TrackLabel.cache.misses - misses}
 
 
 class PDF:
@@ -162,6 +387,16 @@ class PDF:
     margin_x = 15  # Margin from the left edge
     margin_y = 10  # Margin from the top edge
 
+    # 'raster' embeds every card as an image, 'vector' draws the text and QR modules with PDF primitives
+    render_modes = ('raster', 'vector')
+    vector_font_family = 'label-font'
+
+    # 'memory' builds the whole document with FPDF, 'stream' writes every finished page straight to disk
+    output_modes = ('memory', 'stream')
+
+    # Rendered pages in flight while streaming, a raster page holds its label and QR code images (~23 MB)
+    stream_pages_in_flight = 2
+
     @staticmethod
     def __get_tracks_per_page(layout_style: str):
         if layout_style not in PDF.layout:
@@ -182,14 +417,36 @@ class PDF:
         return pages
 
     def __init__(self, track_list: list[Track], style: dict, redis_client=None, status_key=None, update_method=None,
-                 meta: dict = None, layout_style: str = "default"):
-        self.pdf = FPDF(orientation = 'P', unit = 'mm', format = 'A4')
+                 meta: dict = None, layout_style: str = "default", render_mode: str = "raster",
+                 output_mode: str = "memory", chunk_pages: int = None):
+        self.pdf = None
         self.track_list = track_list
 
         if layout_style not in PDF.layout:
             raise RuntimeError(f"Layout-style {layout_style} option not recognised")
 
         self.layout_style = layout_style
+
+        if render_mode not in PDF.render_modes:
+            raise RuntimeError(f"Render-mode {render_mode} option not recognised")
+
+        self.render_mode = render_mode
+
+        if output_mode not in PDF.output_modes:
+            raise RuntimeError(f"Output-mode {output_mode} option not recognised")
+
+        if output_mode == "stream" and render_mode != "raster":
+            raise RuntimeError("Output-mode stream only supports the raster render-mode")
+
+        self.output_mode = output_mode
+
+        # Split the document into part-PDFs of at most chunk_pages pages, keeping label and QR code pages together
+        if chunk_pages is not None and chunk_pages < 2:
+            raise RuntimeError("A chunk needs at least two pages")
+
+        self.chunk_pages = chunk_pages + chunk_pages % 2 if chunk_pages else None
+        self.output_paths = []
+
         self.total_pages = self.get_total_pages(len(track_list), self.layout_style)
 
         # Style linting here.
@@ -210,7 +467,134 @@ class PDF:
 
         self.style = style
 
+    def __open_document(self, output_path: str):
+        if self.output_mode == "stream":
+            self.pdf = StreamingPDFWriter(output_path)
+        else:
+            self.pdf = FPDF(orientation = 'P', unit = 'mm', format = 'A4')
+            if self.render_mode == "vector":
+                self.pdf.add_font(PDF.vector_font_family, fname = self.style['font_path'])
+
+        self.output_paths.append(output_path)
+
+    def __close_document(self):
+        # Save the PDF to its output path
+        if self.output_mode == "stream":
+            self.pdf.close()
+        else:
+            self.pdf.output(self.output_paths[-1])
+
+        self.pdf = None
+
+    def __abort_document(self):
+        # Streamed documents already have pages on disk, remove the incomplete file
+        if self.output_mode == "stream":
+            self.pdf.close()
+            remove(self.output_paths[-1])
+            self.output_paths.pop()
+
+        self.pdf = None
+
+    @staticmethod
+    def get_part_path(output_path: str, part: int) -> str:
+        root, extension = path.splitext(output_path)
+        return f"{root}_part{part}{extension}"
+
+    def __place_label(self, rendered_label, x: float, y: float, w: float, h: float):
+        if self.render_mode == "raster":
+            self.pdf.image(rendered_label, x = x, y = y, w = w, h = h)
+            return
+
+        # Scale the pixel layout of the label image onto the label in mm
+        scale = w / TrackLabel.img_size
+        for text, text_x, text_y, font_size in rendered_label:
+            # The layout positions the top of the text, the PDF positions its baseline
+            ascent = load_font(self.style['font_path'], font_size).getmetrics()[0]
+
+            self.pdf.set_font(PDF.vector_font_family, size = font_size * scale * 72 / 25.4)  # mm to pt
+            self.pdf.text(x + text_x * scale, y + (text_y + ascent) * scale, text)
+
+    def __place_qr_code(self, rendered_qr_code, x: float, y: float, w: float, h: float):
+        if self.render_mode == "raster":
+            self.pdf.image(rendered_qr_code, x = x, y = y, w = w, h = h)
+            return
+
+        module_w = w / len(rendered_qr_code)
+        module_h = h / len(rendered_qr_code)
+        self.pdf.set_fill_color(0)
+        for row, modules in enumerate(rendered_qr_code):
+            # Draw every horizontal run of dark modules as a single rectangle
+            run_start = None
+            for col, dark in enumerate(modules + [False]):
+                if dark and run_start is None:
+                    run_start = col
+                elif not dark and run_start is not None:
+                    self.pdf.rect(x + run_start * module_w, y + row * module_h,
+                                  (col - run_start) * module_w, module_h, style = "F")
+                    run_start = None
+
+    def __render_pages(self, pages: list[list[Track]]):
+        """
+        Yields the rendered (label_images, qr_code_images, reused) of every page, in page order.
+        Pages are rendered ahead by the render pool of the process, with a bounded amount of pages in flight so
+        memory stays flat, while the single FPDF writer consumes them in order. Streaming keeps at most
+        stream_pages_in_flight pages in flight, so its memory does not grow with the amount of CPUs.
+        """
+        # Vector pages are cheap to lay out, only raster pages are worth sending to other processes
+        processes = min(RENDER_PROCESSES, len(pages)) if self.render_mode == "raster" else 1
+        if self.output_mode == "stream":
+            processes = min(processes, PDF.stream_pages_in_flight)
+        pages_in_flight = PDF.stream_pages_in_flight if self.output_mode == "stream" else processes * 2
+
+        jobs = [(page, self.style, self.render_mode) for page in pages]
+
+        executor = get_render_pool() if processes > 1 else None
+        in_flight = deque()
+        if executor is not None:
+            try:
+                for job in islice(jobs, pages_in_flight):
+                    in_flight.append(executor.submit(render_page, *job))
+            except (AssertionError, BrokenProcessPool):
+                # Daemonic processes (e.g. a prefork Celery worker) are not allowed to start child processes
+                reset_render_pool(executor)
+                executor = None
+                in_flight.clear()
+
+        if executor is None:
+            for job in jobs:
+                yield render_page(*job)
+            return
+
+        try:
+            next_page = len(in_flight)
+            while in_flight:
+                try:
+                    rendered_page = in_flight.popleft().result()
+                except BrokenProcessPool:
+                    # A render process died, the pool can not be used by the next exports either
+                    reset_render_pool(executor)
+                    raise
+
+                # Keep the pool busy with the next page
+                if next_page < len(jobs):
+                    in_flight.append(executor.submit(render_page, *jobs[next_page]))
+                    next_page += 1
+
+                yield rendered_page
+        finally:
+            # Also runs when the export stops early, the pool is shared so only the pages of this export are dropped
+            for future in in_flight:
+                future.cancel()
+
     def export(self, output_path):
+        if self.redis_client is None:
+            return self.__export(output_path, None)
+
+        # Watch for a stop request in the background, instead of asking redis before every card
+        with CancellationWatcher(self.redis_client, self.status_key) as cancellation_watcher:
+            return self.__export(output_path, cancellation_watcher)
+
+    def __export(self, output_path, cancellation_watcher: CancellationWatcher | None):
 
         labels_per_row = PDF.layout[self.layout_style]['labels_per_row']
         labels_per_column = PDF.layout[self.layout_style]['labels_per_column']
@@ -218,92 +602,97 @@ class PDF:
         label_height = PDF.layout[self.layout_style]['label_height']
 
         page_count = 0
-        runtimes = []
+        pages_reused = 0
+        page_time = RunningEstimate()
 
         def update(page_count, start_time):
             if self.update_method is not None:
                 progress = 100 / self.total_pages * page_count
 
-                runtimes.append(time() - start_time)
-                avg_time = sum(runtimes) / len(runtimes)
+                avg_time = page_time.update(time() - start_time)
                 time_left = round(avg_time * (self.total_pages - page_count))
                 time_left_string = str(timedelta(seconds = time_left))
 
                 self.meta['progress'] = progress
                 self.meta['progress_info']['total_pages'] = f"({page_count}/{self.total_pages})"
                 self.meta['progress_info']['time_left_estimate'] = time_left_string
+                self.meta['progress_info']['pages_reused'] = pages_reused
 
                 self.update_method(state = "EXPORTING", meta = self.meta)
 
         def user_exit():
-            if self.redis_client is None:
-                return False
-
-            user_input = self.redis_client.get(self.status_key)
-            if user_input and user_input.decode() == "stop":
-                return True
-            return False
+            return cancellation_watcher is not None and cancellation_watcher.cancelled()
 
         total_tracks = len(self.track_list)
         tracks_per_page = labels_per_row * labels_per_column
 
-        for i in range(0, total_tracks, tracks_per_page):
+        pages = [self.track_list[i:i + tracks_per_page] for i in range(0, total_tracks, tracks_per_page)]
+        rendered_pages = self.__render_pages(pages)
+
+        self.output_paths = []
+        self.__open_document(self.get_part_path(output_path, 1) if self.chunk_pages else output_path)
+        document_pages = 0
+
+        start_time = time()
+        for rendered_labels, rendered_qr_codes, reused in rendered_pages:
+            if reused:
+                pages_reused += 2  # The label page and its QR code page
+
+            # Continue in the next part-PDF once the current one is full
+            if self.chunk_pages and document_pages >= self.chunk_pages:
+                self.__close_document()
+                self.__open_document(self.get_part_path(output_path, len(self.output_paths) + 1))
+                document_pages = 0
+            document_pages += 2
+
             # Add a page for TrackLabels
             self.pdf.add_page()
             page_count += 1
-            start_time = time()
 
             # Arrange TrackLabels on the page
-            for index in range(tracks_per_page):
+            for index, rendered_label in enumerate(rendered_labels):
 
                 if user_exit():
+                    rendered_pages.close()
+                    self.__abort_document()
                     return "USER_EXIT"
 
-                track_index = i + index
-                if track_index >= total_tracks:
-                    break  # No more tracks to add
-
                 # Calculate row and column position
                 row = index // labels_per_row
                 col = index % labels_per_row
                 x = PDF.margin_x + col * label_width
                 y = PDF.margin_y + row * label_height
 
-                # Create and place the TrackLabel image
-                track = self.track_list[track_index]
-                track_label = TrackLabel(track, style = self.style)
-                track_label_image = track_label.export()
-                self.pdf.image(track_label_image, x = x, y = y, w = label_width, h = label_height)
+                # Place the TrackLabel
+                self.__place_label(rendered_label, x = x, y = y, w = label_width, h = label_height)
 
             update(page_count, start_time)
+            start_time = time()
 
             # Add a page for QR codes
             self.pdf.add_page()
             page_count += 1
 
             # Arrange QR codes on the page in a mirrored way
-            for index in range(tracks_per_page):
+            for index, rendered_qr_code in enumerate(rendered_qr_codes):
 
                 if user_exit():
+                    rendered_pages.close()
+                    self.__abort_document()
                     return "USER_EXIT"
 
-                track_index = i + index
-                if track_index >= total_tracks:
-                    break  # No more tracks to add
-
                 # Calculate mirrored row and column position
                 row = index // labels_per_row
                 col = (labels_per_row - 1) - (index % labels_per_row)  # Mirror horizontally
                 x = PDF.margin_x + col * label_width
                 y = PDF.margin_y + row * label_height
 
-                # Create and place the QR code image
-                track = self.track_list[track_index]
-                qr_code_image = QRCode.generate(track.url)
-                self.pdf.image(qr_code_image, x = x, y = y, w = label_width, h = label_height)
+                # Place the QR code
+                self.__place_qr_code(rendered_qr_code, x = x, y = y, w = label_width, h = label_height)
 
             update(page_count, start_time)
+            start_time = time()
+
+        self.__close_document()
 
-        # Save the PDF to the specified output path
-        self.pdf.output(output_path)
         return "FINISHED"
@@ -1,3 +1,7 @@
+import hashlib
+import os
+
+
 class Cache:
     __data = {}
 
@@ -41,3 +45,91 @@ class Cache:
             raise RuntimeError("Key not found")
 
         del Cache.__data[attribute][key]
+
+
+class DiskCache:
+    def __init__(self, directory: str, max_bytes: int):
+        """
+        Content-addressed cache of files in a directory, bounded to max_bytes.
+        Entries are evicted least recently used first, every hit refreshes the modification time of its file.
+        Safe to share between processes, files are written atomically and eviction tolerates concurrent removal.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.__bytes_written = 0
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        """Hashes the inputs an entry depends on into its key."""
+        return hashlib.sha256("\0".join(str(part) for part in parts).encode()).hexdigest()
+
+    def __path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key: str) -> bytes | None:
+        path = self.__path(key)
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+            os.utime(path)  # Mark as recently used
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return data
+
+    def put(self, key: str, data: bytes):
+        path = self.__path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok = True)
+
+            # Write to a temporary file first so other processes never read a partial entry
+            temporary_path = f"{path}.{os.getpid()}.tmp"
+            with open(temporary_path, "wb") as file:
+                file.write(data)
+            os.replace(temporary_path, path)
+        except OSError as e:
+            print(f"Error writing cache entry: {e}")
+            return
+
+        # Only scan the directory for eviction once in a while
+        self.__bytes_written += len(data)
+        if self.__bytes_written > self.max_bytes // 10:
+            self.__bytes_written = 0
+            self.evict()
+
+    def evict(self):
+        """Removes the least recently used entries until the cache is below 90% of max_bytes."""
+        entries = []
+        total_bytes = 0
+        for directory, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                try:
+                    stat = os.stat(os.path.join(directory, filename))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, os.path.join(directory, filename)))
+                total_bytes += stat.st_size
+
+        if total_bytes <= self.max_bytes:
+            return
+
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0
+        }
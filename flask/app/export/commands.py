@@ -0,0 +1,26 @@
+from os import environ
+
+import click
+
+from spotify import database
+from . import export_bp
+from .backend import warm_card_cache
+
+
+@export_bp.cli.command("warm-card-cache")
+@click.argument("playlist_scan_ids", nargs = -1, required = True)
+def warm_card_cache_command(playlist_scan_ids):
+    """Renders the label images of the given playlist scans into the card cache."""
+    tracks = {}
+    with database.connect() as daos:
+        for playlist_scan_id in playlist_scan_ids:
+            playlist_scan = daos.playlist_scan_dao.get_instance(playlist_scan_id, True)
+            if not playlist_scan:
+                click.echo(f"Playlist scan {playlist_scan_id} not found")
+                continue
+
+            for track in playlist_scan.get_all_tracks():
+                tracks[track.id] = track
+
+    stats = warm_card_cache(list(tracks.values()), {'font_path': environ.get("FONT_PATH")})
+    click.echo(f"Warmed {len(tracks)} cards: {stats['hits']} already cached, {stats['misses']} rendered")
@@ -1,20 +1,32 @@
-import mysql.connector
-import requests
-from flask import request, jsonify, session
-
-from spotify.playlist import PlaylistDAO, Playlist
-from spotify.playlist_scan import PlaylistScan, PlaylistScanDAO
-from spotify.album import AlbumDAO
-from spotify.artist import ArtistDAO
-from spotify.track import TrackDAO
-from spotify.user import UserDAO, User
+from flask import request, jsonify, session, Response, stream_with_context
+
+from spotify import database
+from spotify.api.client import get_client
+from spotify.playlist_scan import PlaylistScan, MAX_DELTA_CHAIN
+from spotify.user import User
 from celery import shared_task
 from celery.result import AsyncResult
 from . import export_bp
 import json
-from os import environ
+import re
+from glob import glob
+from os import environ, makedirs, path, remove, replace
+import shutil
+from time import time
 
 from .backend import PDF
+from .progress import ProgressPublisher, get_progress_key, TERMINAL_STATES
+
+# Seconds between keepalive comments on an idle progress stream
+PROGRESS_KEEPALIVE = 15
+
+# Seconds a listing of the playlists of a user is cached, and after how many seconds it is refreshed in the background
+RECENT_PLAYLISTS_TTL = 24 * 60 * 60
+RECENT_PLAYLISTS_MAX_AGE = int(environ.get("RECENT_PLAYLISTS_MAX_AGE", 5 * 60))
+RECENT_PLAYLISTS_LOCK_TTL = 5 * 60
+
+# Maximum amount of playlists Spotify returns per page
+RECENT_PLAYLISTS_PAGE_LIMIT = 50
 
 
 @export_bp.route("/api/start-build", methods = ["POST"])
@@ -25,42 +37,120 @@ def start_build_scan():
         return {'error': 'User not logged in'}, 500
 
     playlist_id = request.get_json().get('playlist_id')
+    full_scan = bool(request.get_json().get('full_scan', False))
 
-    task = build_playlist_scan.delay(playlist_id, access_token, user_vars)
+    task = build_playlist_scan.delay(playlist_id, access_token, user_vars, full_scan)
     return {"task_id": task.id}
 
 
 @export_bp.route('/api/recent_playlists', methods=['GET'])
 def get_recent_playlists():
+    # Import inside function to combat circular import error
+    from .. import redis_client
+
     access_token = session.get('access_token')
     user_vars = session.get('user_vars')
     if not access_token or not user_vars:
         return {'error': 'User not logged in'}, 500
 
-    # Call Spotify API to fetch playlists
-    headers = {'Authorization': f'Bearer {access_token}', }
+    listing = get_cached_playlists(redis_client, user_vars['id'])
 
-    url = f"https://api.spotify.com/v1/users/{user_vars['id']}/playlists"
+    if listing is None:
+        # Nothing cached yet, fetch the first page right away and the rest in the background
+        response = get_client().get(f"https://api.spotify.com/v1/users/{user_vars['id']}/playlists",
+                                    access_token = access_token, params = {'limit': RECENT_PLAYLISTS_PAGE_LIMIT})
 
-    response = requests.get(url, headers=headers)
+        if response.status_code != 200:
+            return jsonify({"error": response.json().get('error', {}).get('message', 'Unknown error')}), response.status_code
 
-    if response.status_code != 200:
-        return jsonify({"error": response.json().get('error', {}).get('message', 'Unknown error')}), response.status_code
+        data = response.json()
+        listing = {
+            'playlists': [format_playlist(playlist) for playlist in data.get("items", []) if playlist],
+            'etag': None,  # Unknown until every page is listed
+            'complete': not data.get('next'),
+            'refreshed_at': time()
+        }
+        put_cached_playlists(redis_client, user_vars['id'], listing)
+
+    if not listing['complete'] or time() - listing['refreshed_at'] > RECENT_PLAYLISTS_MAX_AGE:
+        # Only one refresh per user at a time
+        if redis_client.set(f"recent_playlists_refresh:{user_vars['id']}", 1, nx = True, ex = RECENT_PLAYLISTS_LOCK_TTL):
+            refresh_recent_playlists.delay(user_vars['id'], access_token)
+
+    response = jsonify(listing['playlists'])
+    response.headers['X-Listing-Complete'] = 'true' if listing['complete'] else 'false'
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+def format_playlist(playlist: dict) -> dict:
+    """Formats the playlist data of the Spotify API for the frontend."""
+    return {
+        "id": playlist["id"],
+        "name": playlist["name"],
+        "image_url": playlist["images"][0]["url"] if playlist.get("images") else None,
+        "track_count": playlist["tracks"]["total"]
+    }
 
-    data = response.json()
 
-    # Format the playlist data for the frontend
-    playlists = [
-        {
-            "id": playlist["id"],
-            "name": playlist["name"],
-            "image_url": playlist["images"][0]["url"] if playlist["images"] else None,
-            "track_count": playlist["tracks"]["total"]
-        }
-        for playlist in data.get("items", [])
-    ]
+def get_cached_playlists(redis_client, user_id: str) -> dict | None:
+    cached = redis_client.get(f"recent_playlists:{user_id}")
+    return json.loads(cached) if cached else None
+
 
-    return jsonify(playlists)
+def put_cached_playlists(redis_client, user_id: str, listing: dict):
+    redis_client.set(f"recent_playlists:{user_id}", json.dumps(listing), ex = RECENT_PLAYLISTS_TTL)
+
+
+@shared_task(bind = True)
+def refresh_recent_playlists(self, user_id: str, access_token: str):
+    """
+    Lists all the playlists of a user into the cache, page by page.
+    The first page is revalidated with the ETag of the cached listing, when Spotify reports it unchanged the
+    cached listing is kept without listing the other pages.
+    """
+    from .. import redis_client
+
+    client = get_client()
+    listing = get_cached_playlists(redis_client, user_id)
+
+    try:
+        url = f"https://api.spotify.com/v1/users/{user_id}/playlists"
+        params = {'limit': RECENT_PLAYLISTS_PAGE_LIMIT}
+        headers = {'If-None-Match': listing['etag']} if listing and listing.get('etag') and listing['complete'] else {}
+
+        response = client.get(url, access_token = access_token, params = params, headers = headers)
+        if response.status_code == 304:
+            listing['refreshed_at'] = time()
+            put_cached_playlists(redis_client, user_id, listing)
+            return
+
+        playlists = []
+        etag = response.headers.get('ETag')
+        while True:
+            if response.status_code != 200:
+                print(f"Error listing playlists: {response.status_code} - {response.text}")
+                return
+
+            data = response.json()
+            playlists += [format_playlist(playlist) for playlist in data.get("items", []) if playlist]
+
+            # Store every page, so the browse page can show the playlists listed so far.
+            # A complete listing is kept until the new one is complete as well
+            url = data.get('next')
+            if not url or not (listing and listing['complete']):
+                put_cached_playlists(redis_client, user_id, {
+                    'playlists': playlists,
+                    'etag': etag,
+                    'complete': not url,
+                    'refreshed_at': time()
+                })
+            if not url:
+                return
+
+            response = client.get(url, access_token = access_token)
+    finally:
+        redis_client.delete(f"recent_playlists_refresh:{user_id}")
 
 
 @export_bp.route("/api/start-export", methods = ["POST"])
@@ -102,87 +192,100 @@ def get_playlist_details():
     if not config:
         return jsonify({"error": "config json is required"}), 400
 
-    with mysql.connector.connect(
-            host = environ["MYSQL_HOST"],
-            user = environ["MYSQL_USER"],
-            password = environ["MYSQL_PASSWORD"],
-            database = environ["MYSQL_DATABASE"]
-    ) as connection:
-        artist_dao = ArtistDAO(connection)
-        album_dao = AlbumDAO(connection, artist_dao)
-        track_dao = TrackDAO(connection, album_dao, artist_dao)
-        user_dao = UserDAO(connection)
-        playlist_dao = PlaylistDAO(connection)
-        playlist_scan_dao = PlaylistScanDAO(connection, playlist_dao, user_dao, track_dao)
-
-        if config.get('extend_scan', None) and config['extend_scan'] != "":
-            newer_than_date = playlist_scan_dao.get_attributes(config['extend_scan'], ('ps.timestamp',))['timestamp']
-        else:
-            newer_than_date = None
-
-        attributes = playlist_scan_dao.get_attributes(playlist_scan_id, (
-            'p.title', 'p.id AS playlist_id', 'p.cover_image_url', 'ps.export_completed'
-        ))
-
-        # Get all the available previous scans to extend from
-        attributes['extend_options'] = playlist_scan_dao.get_available_scans_to_extend_from(attributes['playlist_id'])
-
-        if config.get('only_unique', False):
-            track_attributes = playlist_scan_dao.get_track_attributes(playlist_scan_id, (
-                'COUNT(DISTINCT track_id) as amount_of_unique_tracks',
-            ), newer_than_date)
-            attributes['amount_of_tracks'] = track_attributes['amount_of_unique_tracks'] if track_attributes['amount_of_unique_tracks'] else 0
-        else:
-            track_attributes = playlist_scan_dao.get_track_attributes(playlist_scan_id, (
-                'COUNT(track_id) as amount_of_tracks',
-            ), newer_than_date)
-            attributes['amount_of_tracks'] = track_attributes['amount_of_tracks'] if track_attributes['amount_of_tracks'] else 0
-
-        attributes['total_pages'] = PDF.get_total_pages(attributes['amount_of_tracks'], config.get('pdf_layout_style', 'default'))
-
-    if attributes:
-        return jsonify(attributes), 200
-    else:
+    with database.connect() as daos:
+        # The playlist, the scans to extend from and the precomputed track counts, in a single lookup
+        details = daos.playlist_scan_dao.get_details(playlist_scan_id, config.get('extend_scan') or None)
+    if not details:
         return jsonify({"error": "Error getting playlist object, is the id correct?"}), 400
 
+    attributes = {key: details[key] for key in ('title', 'playlist_id', 'cover_image_url', 'export_completed',
+                                                'extend_options')}
+    attributes['pdf_filenames'] = [export_path.split('/')[-1] for export_path in get_export_paths(playlist_scan_id)]
 
-@shared_task(bind = True)
-def build_playlist_scan(self, playlist_id: str, access_token: str, user_vars: dict):
-    # Do playlist url linting
-    self.update_state(state = "BUILDING",
-                      meta = {'progress_info': {'task_description': 'Getting Playlist info'}})
+    if config.get('only_unique', False):
+        attributes['amount_of_tracks'] = details['amount_of_unique_tracks']
+    else:
+        attributes['amount_of_tracks'] = details['amount_of_tracks']
 
-    # Build user from user_vars
-    user = User(**user_vars)
+    attributes['total_pages'] = PDF.get_total_pages(attributes['amount_of_tracks'], config.get('pdf_layout_style', 'default'))
 
-    # Create PlaylistScan object
-    self.update_state(state = "BUILDING", meta = {'progress_info': {'task_description': 'Building Tracks using Spotify API'}})
-    try:
-        playlist_scan = PlaylistScan.build_from_api(playlist_id, access_token, user)
-    except RuntimeError as e:
-        return {'state': 'ERROR', 'error_msg': str(e)}
+    return jsonify(attributes), 200
+
+
+def get_export_paths(playlist_scan_id: str) -> list[str]:
+    """The exported PDF of a scan, or its part-PDFs when the export was chunked."""
+    # One directory scan, filtered down to the exports of this scan
+    output_path = f"/data/playlist/mixster_export_{playlist_scan_id}.pdf"
+    return sorted(
+        (export_path for export_path in glob(f"/data/playlist/mixster_export_{playlist_scan_id}*.pdf")
+         if export_path == output_path or re.fullmatch(r"_part\d+\.pdf", export_path[len(output_path) - 4:])),
+        key = lambda export_path: (len(export_path), export_path)
+    )
+
+
+@shared_task(bind = True)
+def build_playlist_scan(self, playlist_id: str, access_token: str, user_vars: dict, full_scan: bool = False):
+    from .. import redis_client
+
+    publish = ProgressPublisher(redis_client, self.request.id, self.update_state)
 
-    # Save PlaylistScan object to database
-    self.update_state(state = "PUSHING", meta = {'progress_info': {'task_description': 'Pushing Playlist data to Database'}})
     try:
-        with mysql.connector.connect(
-                host = environ["MYSQL_HOST"],
-                user = environ["MYSQL_USER"],
-                password = environ["MYSQL_PASSWORD"],
-                database = environ["MYSQL_DATABASE"]
-        ) as connection:
-            # Create DAO instances
-            artist_dao = ArtistDAO(connection)
-            album_dao = AlbumDAO(connection, artist_dao)
-            track_dao = TrackDAO(connection, album_dao, artist_dao)
-            user_dao = UserDAO(connection)
-            playlist_dao = PlaylistDAO(connection)
-            playlist_scan_dao = PlaylistScanDAO(connection, playlist_dao, user_dao, track_dao)
-            playlist_scan_dao.put_instance(playlist_scan)
+        # Do playlist url linting
+        publish(state = "BUILDING", meta = {'progress_info': {'task_description': 'Getting Playlist info'}})
+
+        # Build user from user_vars
+        user = User(**user_vars)
+
+        # Rescans only fetch and store what changed since the latest scan of the playlist
+        extends_playlist_scan = None
+        extended_track_ids = None
+        if not full_scan:
+            publish(state = "BUILDING", meta = {'progress_info': {'task_description': 'Comparing with the previous scan'}})
+            try:
+                with database.connect() as daos:
+                    extends_playlist_scan = daos.playlist_scan_dao.get_latest_instance(playlist_id)
+                    if extends_playlist_scan:
+                        if len(daos.playlist_scan_dao.get_scan_chain(extends_playlist_scan.id)) > MAX_DELTA_CHAIN:
+                            extends_playlist_scan = None
+                        else:
+                            extended_track_ids = daos.playlist_scan_dao.get_track_ids(extends_playlist_scan.id)
+            except Exception as e:
+                print(f"Error fetching the previous scan, doing a full scan: {e}")
+                extends_playlist_scan = None
+
+        # Create PlaylistScan object
+        publish(state = "BUILDING", meta = {'progress_info': {'task_description': 'Building Tracks using Spotify API'}})
+        try:
+            if extends_playlist_scan:
+                playlist_scan = PlaylistScan.build_delta_from_api(playlist_id, access_token, user, extends_playlist_scan,
+                                                                  extended_track_ids)
+            else:
+                playlist_scan = PlaylistScan.build_from_api(playlist_id, access_token, user)
+        except RuntimeError as e:
+            publish.finish("ERROR", {'error_msg': str(e)})
+            return {'state': 'ERROR', 'error_msg': str(e)}
+
+        # Save PlaylistScan object to database, an unchanged playlist reuses its latest scan
+        if playlist_scan is not extends_playlist_scan:
+            publish(state = "PUSHING", meta = {'progress_info': {'task_description': 'Pushing Playlist data to Database'}})
+            try:
+                with database.connect() as daos:
+                    daos.playlist_scan_dao.put_instance(playlist_scan)
+            except Exception as e:
+                publish.finish("ERROR", {'error_msg': str(e)})
+                return {'state': 'ERROR', 'error_msg': str(e)}
+
+        # Returned as well, otherwise Celery overwrites the final state with an empty result
+        meta = {'progress_info': {'task_description': 'Playlist initialised', 'playlist_scan_id': playlist_scan.id}}
+        publish.finish("SUCCESS", meta)
+        return meta
     except Exception as e:
-        return {'state': 'ERROR', 'error_msg': str(e)}
-
-    self.update_state(state = "SUCCESS", meta = {'progress_info': {'task_description': 'Playlist initialised', 'playlist_scan_id': playlist_scan.id}})
+        # Celery stores FAILURE, make the stream and /api/progress show the task ended as well
+        publish.finish("ERROR", {'error_msg': str(e)})
+        raise
+    finally:
+        # A throttled update published after the task ended would show it as running again
+        publish.cancel()
 
 
 @shared_task(bind = True)
@@ -200,99 +303,189 @@ def build_pdf(self, playlist_scan_id: str, config: dict):
             'iteration': 0,
             'time_left_estimate': "N/A",
             'total_tracks': '',
-            'total_pages': ''
+            'total_pages': '',
+            'pages_reused': 0
         }
     }
 
-    # Set initial 0% State
-    self.update_state(state = "PULLING", meta = meta)
-
-    with mysql.connector.connect(
-            host = environ["MYSQL_HOST"],
-            user = environ["MYSQL_USER"],
-            password = environ["MYSQL_PASSWORD"],
-            database = environ["MYSQL_DATABASE"]
-    ) as connection:
-        # Create DAO instances
-        artist_dao = ArtistDAO(connection)
-        album_dao = AlbumDAO(connection, artist_dao)
-        track_dao = TrackDAO(connection, album_dao, artist_dao)
-        user_dao = UserDAO(connection)
-        playlist_dao = PlaylistDAO(connection)
-        playlist_scan_dao = PlaylistScanDAO(connection, playlist_dao, user_dao, track_dao)
-
-        if config.get("extend_scan", None):
-            extends_playlist_scan = playlist_scan_dao.get_instance(config['extend_scan'])
-            playlist_scan = playlist_scan_dao.get_instance(playlist_scan_id, config.get('only_unique', False), tracks_newer_than = extends_playlist_scan.created_at)
-            playlist_scan.extends_playlist_scan = extends_playlist_scan
-        else:
-            playlist_scan = playlist_scan_dao.get_instance(playlist_scan_id, config.get('only_unique', False))
-
-        amount_of_tracks = len(playlist_scan.tracks)
+    publish = ProgressPublisher(redis_client, self.request.id, self.update_state)
 
+    try:
         # Set initial 0% State
-        meta['progress_info']['total_tracks'] = str(amount_of_tracks)
-
-        total_pages = PDF.get_total_pages(amount_of_tracks, config.get('pdf_layout_style', 'default'))
-        meta['progress_info']['total_pages'] = str(total_pages)
-
-        self.update_state(state = "PULLING", meta = meta)
-
-        updated_tracks = []
-        for track in playlist_scan.tracks:
-            updated_track = track
-            updated_track.url = f"{track.url}?playlist_scan_id={playlist_scan_id}"
-            updated_tracks.append(updated_track)
-
-        meta['progress_info']['task_description'] = "Exporting data to PDF"
+        publish(state = "PULLING", meta = meta)
+
+        with database.connect() as daos:
+            playlist_scan_dao = daos.playlist_scan_dao
+
+            # Only export the tracks added since the scan to extend, without storing it as the scan this one extends
+            if config.get("extend_scan", None):
+                extends_created_at = playlist_scan_dao.get_attributes(config['extend_scan'], ('ps.timestamp',))['timestamp']
+                playlist_scan = playlist_scan_dao.get_instance(playlist_scan_id, config.get('only_unique', False), tracks_newer_than = extends_created_at)
+            else:
+                playlist_scan = playlist_scan_dao.get_instance(playlist_scan_id, config.get('only_unique', False))
+
+            # A delta scan inherits the start of the playlist from the scans it extends
+            tracks = playlist_scan.get_all_tracks(config.get('only_unique', False))
+            amount_of_tracks = len(tracks)
+
+            # Set initial 0% State
+            meta['progress_info']['total_tracks'] = str(amount_of_tracks)
+
+            total_pages = PDF.get_total_pages(amount_of_tracks, config.get('pdf_layout_style', 'default'))
+            meta['progress_info']['total_pages'] = str(total_pages)
+
+            publish(state = "PULLING", meta = meta)
+
+            updated_tracks = []
+            for track in tracks:
+                updated_track = track
+                # Built from the id, the same Track instance can appear more than once
+                updated_track.url = f"https://open.spotify.com/track/{track.id}?playlist_scan_id={playlist_scan_id}"
+                updated_tracks.append(updated_track)
+
+            meta['progress_info']['task_description'] = "Exporting data to PDF"
+
+            # Generate a pdf with the playlist, track_info.
+            pdf_output_path = f"/data/playlist/mixster_export_{playlist_scan_id}.pdf"
+
+            # Streaming only supports raster documents, vector documents are small enough to build in memory
+            render_mode = config.get('pdf_render_mode', 'raster')
+            output_mode = config.get('pdf_output_mode', environ.get("PDF_OUTPUT_MODE", 'memory')) if render_mode == 'raster' else 'memory'
+            chunk_pages = int(config['pdf_chunk_pages']) if config.get('pdf_chunk_pages') else None
+
+            # Export into a directory of this task, the earlier export stays available until this one is finished
+            staging_dir = f"/data/playlist/tmp/{self.request.id}"
+            makedirs(staging_dir, exist_ok = True)
+
+            pdf = PDF(updated_tracks, {'font_path': environ.get("FONT_PATH")},
+                      redis_client = redis_client,
+                      status_key = f"task_status:{self.request.id}",
+                      update_method = publish,
+                      meta = meta,
+                      layout_style = config.get('pdf_layout_style', 'default'),
+                      render_mode = render_mode,
+                      output_mode = output_mode,
+                      chunk_pages = chunk_pages)
+
+            try:
+                result = pdf.export(path.join(staging_dir, path.basename(pdf_output_path)))
+
+                if result == "USER_EXIT":
+                    # Finished parts of a chunked export are no deck on their own
+                    for output_path in pdf.output_paths:
+                        if path.exists(output_path):
+                            remove(output_path)
+                else:
+                    # Remove the files of the earlier export, which may have been split into a different amount of parts
+                    for old_output_path in get_export_paths(playlist_scan_id):
+                        remove(old_output_path)
+
+                    output_paths = []
+                    for output_path in pdf.output_paths:
+                        output_paths.append(path.join(path.dirname(pdf_output_path), path.basename(output_path)))
+                        replace(output_path, output_paths[-1])
+                    pdf.output_paths = output_paths
+            finally:
+                shutil.rmtree(staging_dir, ignore_errors = True)
+
+            if result == "USER_EXIT":
+                publish.finish("INTERRUPTED", meta)
+                return {"result": "Interrupted"}
+            else:
+
+                # Push to Database
+                playlist_scan_dao.update_export_completed(playlist_scan_id, True)
+
+                meta['progress_info']['task_description'] = "Ready to Download"
+                meta['progress_info']['total_pages'] = f"({total_pages}/{total_pages})"
+                meta['progress_info']['time_left_estimate'] = "0:00:00"
+                meta['progress_info']['pdf_filename'] = pdf.output_paths[0].split('/')[-1]
+                meta['progress_info']['pdf_filenames'] = [output_path.split('/')[-1] for output_path in pdf.output_paths]
+
+                publish.finish("SUCCESS", meta)
+                return meta
+    except Exception as e:
+        # Celery stores FAILURE, make the stream and /api/progress show the task ended as well
+        publish.finish("ERROR", {'error_msg': str(e)})
+        raise
+    finally:
+        # A throttled update published after the task ended would show it as running again
+        publish.cancel()
 
-        # Generate a pdf with the playlist, track_info.
-        pdf_output_path = f"/data/playlist/mixster_export_{playlist_scan_id}.pdf"
 
-        pdf = PDF(updated_tracks, {'font_path': environ.get("FONT_PATH")},
-                  redis_client = redis_client,
-                  status_key = f"task_status:{self.request.id}",
-                  update_method = self.update_state,
-                  meta = meta,
-                  layout_style = config.get('pdf_layout_style', 'default'))
+def get_task_progress(task_id: str) -> dict:
+    """Progress of a task according to the Celery result backend."""
+    task = AsyncResult(task_id)
 
-        result = pdf.export(pdf_output_path)
+    if task.state == "FAILURE":
+        return {"state": "ERROR", "error_msg": str(task.info)}
 
-        if result == "USER_EXIT":
-            return {"result": "Interrupted"}
-        else:
+    if task.info is None or type(task.info) != dict:
+        progress = 0
+        progress_info = {}
+    else:
 
-            # Push to Database
-            playlist_scan.export_completed = True
-            playlist_scan_dao.put_instance(playlist_scan)
+        # Handle internal worker errors:
+        if task.info.get("state", "") == "ERROR":
+            return {"state": "ERROR", "error_msg": str(task.info.get("error_msg", "No message"))}
 
-            meta['progress_info']['task_description'] = "Ready to Download"
-            meta['progress_info']['total_pages'] = f"({total_pages}/{total_pages})"
-            meta['progress_info']['time_left_estimate'] = "0:00:00"
-            meta['progress_info']['pdf_filename'] = pdf_output_path.split('/')[-1]
+        progress = task.info.get("progress", 0)
+        progress_info = task.info.get("progress_info", {})
 
-            return meta
+    return {"state": task.state, "progress": progress, "progress_info": progress_info}
 
 
 @export_bp.route("/api/progress", methods = ["POST"])
 def track_progress():
     data = request.get_json()
+    return get_task_progress(data["task_id"])
 
-    try:
-        task = AsyncResult(data["task_id"])
-
-        if task.info is None or type(task.info) != dict:
-            progress = 0
-            progress_info = {}
-        else:
-
-            # Handle internal worker errors:
-            if task.info.get("state", "") == "ERROR":
-                raise AttributeError(str(task.info.get("error_msg", "No message")))
 
-            progress = task.info.get("progress", 0)
-            progress_info = task.info.get("progress_info", {})
-    except AttributeError as e:
-        return {"state": "ERROR", "error_msg": str(e)}
+@export_bp.route("/api/progress/stream/<task_id>", methods = ["GET"])
+def stream_progress(task_id: str):
+    """
+    Server-Sent Events stream of the progress of a task, fed by the updates the task publishes.
+    Starts with the latest state of the task and ends once the task reached a terminal state.
+    """
+    # Import inside function to combat circular import error
+    from .. import redis_client
 
-    return {"state": task.state, "progress": progress, "progress_info": progress_info}
\ No newline at end of file
+    progress_key = get_progress_key(task_id)
+
+    def event(message: str) -> str:
+        return f"data: {message}\n\n"
+
+    def generate():
+        pubsub = redis_client.pubsub(ignore_subscribe_messages = True)
+        try:
+            # Subscribe before reading the latest state, so no update published in between is missed
+            pubsub.subscribe(progress_key)
+
+            latest = redis_client.get(progress_key)
+            message = latest.decode() if latest else json.dumps(get_task_progress(task_id))
+            yield event(message)
+            if json.loads(message)["state"] in TERMINAL_STATES:
+                return
+
+            while True:
+                update = pubsub.get_message(timeout = PROGRESS_KEEPALIVE)
+                if update is None:
+                    # Catches tasks that ended without publishing, like a worker that crashed
+                    progress = get_task_progress(task_id)
+                    if progress["state"] in TERMINAL_STATES:
+                        yield event(json.dumps(progress))
+                        return
+
+                    # Keeps proxies from closing the idle connection
+                    yield ": keepalive\n\n"
+                    continue
+
+                message = update["data"].decode()
+                yield event(message)
+                if json.loads(message)["state"] in TERMINAL_STATES:
+                    return
+        finally:
+            pubsub.close()
+
+    return Response(stream_with_context(generate()), mimetype = "text/event-stream",
+                    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
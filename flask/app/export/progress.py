@@ -0,0 +1,193 @@
+import copy
+import json
+import threading
+from os import environ
+from time import monotonic
+
+import redis
+
+# Maximum amount of progress updates a task publishes per second, state changes are always published
+PROGRESS_UPDATES_PER_SECOND = float(environ.get("PROGRESS_UPDATES_PER_SECOND", 4))
+
+# Seconds the latest progress of a task is kept around for clients that connect late
+PROGRESS_TTL = 60 * 60
+
+# States after which a task publishes no more progress
+TERMINAL_STATES = ("SUCCESS", "ERROR", "INTERRUPTED")
+
+
+def get_progress_key(task_id: str) -> str:
+    """Redis key holding the latest progress of a task, and the pub/sub channel its updates are published on."""
+    return f"task_progress:{task_id}"
+
+
+class CancellationWatcher:
+    def __init__(self, redis_client, status_key: str, interval: float = 0.5):
+        """
+        Watches the status key of a task from a background thread and raises an in-process flag once a stop is
+        requested, so hot loops can check for cancellation without doing any I/O themselves.
+        :param interval: Seconds between two checks of the status key.
+        """
+        self.redis_client = redis_client
+        self.status_key = status_key
+        self.interval = interval
+
+        self.__cancelled = threading.Event()
+        self.__closed = threading.Event()
+        self.__thread = threading.Thread(target = self.__run, daemon = True)
+
+    def __check(self):
+        try:
+            user_input = self.redis_client.get(self.status_key)
+        except redis.RedisError as e:
+            print(f"Error checking task status: {e}")
+            return
+
+        if user_input and user_input.decode() == "stop":
+            self.__cancelled.set()
+
+    def __run(self):
+        while not self.__cancelled.is_set() and not self.__closed.wait(self.interval):
+            self.__check()
+
+    def start(self):
+        # Check once up front, so a task stopped before it started does not wait for the first interval
+        self.__check()
+        self.__thread.start()
+
+    def close(self):
+        self.__closed.set()
+
+    def cancelled(self) -> bool:
+        return self.__cancelled.is_set()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class RunningEstimate:
+    def __init__(self, smoothing: float = 0.3):
+        """
+        Exponentially weighted moving average, an O(1) estimate that follows the recent measurements.
+        :param smoothing: Weight of the newest measurement, between 0 and 1.
+        """
+        self.smoothing = smoothing
+        self.value = None
+
+    def update(self, measurement: float) -> float:
+        if self.value is None:
+            self.value = measurement
+        else:
+            self.value += self.smoothing * (measurement - self.value)
+        return self.value
+
+
+class ProgressPublisher:
+    def __init__(self, redis_client, task_id: str, update_method=None,
+                 max_updates_per_second: float = PROGRESS_UPDATES_PER_SECOND):
+        """
+        Publishes the progress of a task to redis pub/sub and stores the latest state for clients that connect later.
+        Called like Task.update_state, which it forwards to, but at most max_updates_per_second times per second.
+        Updates that change the state or the task description are never throttled, the newest throttled update is
+        published once the interval passed.
+        :param update_method: The update_state method of the task, called with task_id, state and meta, keeps the result backend (and /api/progress) current.
+        """
+        self.redis_client = redis_client
+        self.task_id = task_id
+        self.key = get_progress_key(task_id)
+        self.update_method = update_method
+        self.min_interval = 1 / max_updates_per_second if max_updates_per_second > 0 else 0
+
+        self.__last_state = None
+        self.__last_description = None
+        self.__last_publish_time = None
+
+        # The newest throttled update, and the timer publishing it once the interval passed
+        self.__pending = None
+        self.__flush_timer = None
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def build_message(state: str, meta: dict | None) -> dict:
+        """Builds the message clients receive, in the same format /api/progress responds with."""
+        meta = meta if isinstance(meta, dict) else {}
+        if state == "ERROR":
+            return {"state": state, "error_msg": str(meta.get("error_msg", "No message"))}
+
+        return {"state": state, "progress": meta.get("progress", 0), "progress_info": meta.get("progress_info", {})}
+
+    def __publish(self, state: str, meta: dict | None):
+        message = json.dumps(ProgressPublisher.build_message(state, meta))
+        try:
+            pipeline = self.redis_client.pipeline()
+            pipeline.set(self.key, message, ex = PROGRESS_TTL)
+            pipeline.publish(self.key, message)
+            pipeline.execute()
+        except redis.RedisError as e:
+            print(f"Error publishing task progress: {e}")
+
+    @staticmethod
+    def __get_description(meta: dict | None):
+        return meta.get("progress_info", {}).get("task_description") if isinstance(meta, dict) else None
+
+    def __send(self, state: str, meta: dict | None):
+        self.__last_state = state
+        self.__last_description = ProgressPublisher.__get_description(meta)
+        self.__last_publish_time = monotonic()
+
+        # The task id is passed along, a throttled update is sent from the timer thread outside the task request
+        if self.update_method is not None:
+            self.update_method(task_id = self.task_id, state = state, meta = meta)
+        self.__publish(state, meta)
+
+    def __cancel_pending(self):
+        self.__pending = None
+        if self.__flush_timer is not None:
+            self.__flush_timer.cancel()
+            self.__flush_timer = None
+
+    def __flush(self):
+        with self.__lock:
+            pending, self.__pending = self.__pending, None
+            self.__flush_timer = None
+            if pending is not None:
+                self.__send(*pending)
+
+    def __call__(self, state: str, meta: dict = None):
+        with self.__lock:
+            now = monotonic()
+            if (state == self.__last_state and self.__get_description(meta) == self.__last_description
+                    and self.__last_publish_time is not None and now - self.__last_publish_time < self.min_interval):
+                # Copied, the task keeps changing its meta in place
+                self.__pending = (state, copy.deepcopy(meta))
+                if self.__flush_timer is None:
+                    self.__flush_timer = threading.Timer(self.min_interval - (now - self.__last_publish_time),
+                                                         self.__flush)
+                    self.__flush_timer.daemon = True
+                    self.__flush_timer.start()
+                return
+
+            self.__cancel_pending()
+            self.__send(state, meta)
+
+    def cancel(self):
+        """Drops the throttled update that is still to be published, e.g. once the task ended."""
+        with self.__lock:
+            self.__cancel_pending()
+
+    def finish(self, state: str, meta: dict = None):
+        """
+        Publishes the terminal state of the task, without forwarding it to update_state.
+        Celery stores the final state itself from the return value of the task.
+        """
+        with self.__lock:
+            # A throttled update is outdated by the terminal state
+            self.__cancel_pending()
+
+            self.__last_state = state
+            self.__last_publish_time = monotonic()
+            self.__publish(state, meta)
@@ -0,0 +1,115 @@
+import zlib
+
+from PIL import Image
+
+
+class StreamingPDFWriter:
+    # Points per millimeter
+    scale = 72 / 25.4
+
+    def __init__(self, output_path: str, page_width: float = 210, page_height: float = 297):
+        """
+        Minimal PDF writer that streams every page, and the images placed on it, to disk as soon as they are added.
+        Only what the raster export needs is supported: pages of a fixed size (in mm) with images placed on them.
+        Memory stays bounded by the page that is being written, instead of growing with the whole document.
+        """
+        self.page_width = page_width * StreamingPDFWriter.scale
+        self.page_height = page_height * StreamingPDFWriter.scale
+
+        self.__file = open(output_path, "wb")
+        self.__offsets = {}
+        self.__next_object_id = 3  # 1 and 2 are reserved for the catalog and the page tree
+        self.__page_ids = []
+
+        # State of the page that is being written
+        self.__page_content = None
+        self.__page_images = None
+
+        self.__file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def __reserve_object_id(self) -> int:
+        object_id = self.__next_object_id
+        self.__next_object_id += 1
+        return object_id
+
+    def __write_object(self, object_id: int, dictionary: str, stream: bytes = None):
+        self.__offsets[object_id] = self.__file.tell()
+        self.__file.write(f"{object_id} 0 obj\n{dictionary}\n".encode())
+        if stream is not None:
+            self.__file.write(b"stream\n" + stream + b"\nendstream\n")
+        self.__file.write(b"endobj\n")
+
+    def __finish_page(self):
+        if self.__page_content is None:
+            return
+
+        content = zlib.compress("\n".join(self.__page_content).encode())
+        content_id = self.__reserve_object_id()
+        self.__write_object(content_id, f"<< /Length {len(content)} /Filter /FlateDecode >>", content)
+
+        x_objects = " ".join(f"/{name} {image_id} 0 R" for name, image_id in self.__page_images.items())
+        page_id = self.__reserve_object_id()
+        self.__write_object(page_id, (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {self.page_width:.2f} {self.page_height:.2f}] "
+            f"/Resources << /XObject << {x_objects} >> >> /Contents {content_id} 0 R >>"
+        ))
+        self.__page_ids.append(page_id)
+
+        self.__page_content = None
+        self.__page_images = None
+
+    def add_page(self):
+        """Finishes the current page, writing it to disk, and starts a new one."""
+        self.__finish_page()
+        self.__page_content = []
+        self.__page_images = {}
+
+    def image(self, image: Image, x: float, y: float, w: float, h: float):
+        """Writes the image to disk and places it on the current page, x/y being its top left corner in mm."""
+        if self.__page_content is None:
+            raise RuntimeError("No page to place the image on, call add_page first")
+
+        if image.mode == "1":
+            color_space, bits_per_component = "/DeviceGray", 1
+        elif image.mode == "L":
+            color_space, bits_per_component = "/DeviceGray", 8
+        else:
+            image = image.convert("RGB")
+            color_space, bits_per_component = "/DeviceRGB", 8
+
+        data = zlib.compress(image.tobytes(), 6)
+        image_id = self.__reserve_object_id()
+        self.__write_object(image_id, (
+            f"<< /Type /XObject /Subtype /Image /Width {image.width} /Height {image.height} "
+            f"/ColorSpace {color_space} /BitsPerComponent {bits_per_component} /Filter /FlateDecode "
+            f"/Length {len(data)} >>"
+        ), data)
+
+        name = f"Im{image_id}"
+        self.__page_images[name] = image_id
+
+        # PDF coordinates start at the bottom left, in points
+        scale = StreamingPDFWriter.scale
+        self.__page_content.append(
+            f"q {w * scale:.2f} 0 0 {h * scale:.2f} {x * scale:.2f} {self.page_height - (y + h) * scale:.2f} cm "
+            f"/{name} Do Q"
+        )
+
+    def close(self):
+        """Finishes the last page and writes the page tree, catalog and cross-reference table."""
+        self.__finish_page()
+
+        kids = " ".join(f"{page_id} 0 R" for page_id in self.__page_ids)
+        self.__write_object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.__page_ids)} >>")
+        self.__write_object(1, "<< /Type /Catalog /Pages 2 0 R >>")
+
+        xref_offset = self.__file.tell()
+        self.__file.write(f"xref\n0 {self.__next_object_id}\n0000000000 65535 f \n".encode())
+        for object_id in range(1, self.__next_object_id):
+            self.__file.write(f"{self.__offsets[object_id]:010d} 00000 n \n".encode())
+        self.__file.write((
+            f"trailer\n<< /Size {self.__next_object_id} /Root 1 0 R >>\n"
+            f"startxref\n{xref_offset}\n%%EOF\n"
+        ).encode())
+
+        self.__file.close()
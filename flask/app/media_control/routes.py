@@ -1,6 +1,6 @@
-import requests
 from flask import request, session, jsonify
 
+from spotify.api.client import get_client
 from . import media_control_bp
 
 # Spotify API endpoint for checking playback state
@@ -17,8 +17,7 @@ def get_error(response):
 
 
 def get_playback_data(access_token):
-    headers = {'Authorization': f'Bearer {access_token}', }
-    response = requests.get(SPOTIFY_PLAYER_URL, headers = headers)
+    response = get_client().get(SPOTIFY_PLAYER_URL, access_token = access_token)
 
     if response.status_code != 200:
         return get_error(response)
@@ -42,9 +41,7 @@ def control_playback(access_token, control_type, device_id=None):
         if not device_id:
             return jsonify({"error": "no playable device found"}), 400
 
-    headers = {'Authorization': f'Bearer {access_token}'}
-
-    response = requests.put(f"{SPOTIFY_PLAYER_URL}/{control_type}", headers = headers, json = {'device_id': device_id})
+    response = get_client().put(f"{SPOTIFY_PLAYER_URL}/{control_type}", access_token = access_token, json = {'device_id': device_id})
 
     if response.status_code != 200:
         return get_error(response)
@@ -68,10 +65,8 @@ def check_preconditions():
             "message": "You are not logged in. Please log in to continue."
         }), 401
 
-    headers = {'Authorization': f'Bearer {access_token}', }
-
     # Check for an active device
-    response = requests.get(SPOTIFY_PLAYER_URL, headers = headers)
+    response = get_client().get(SPOTIFY_PLAYER_URL, access_token = access_token)
 
     if response.status_code == 200:
         playback_data = response.json()
@@ -113,11 +108,6 @@ def play():
 
     track_uri = f"spotify:track:{track_id}"
 
-    headers = {
-        'Authorization': f'Bearer {access_token}',
-        'Content-Type': 'application/json'
-    }
-
     # Construct URL with optional device_id query parameter
     url = f"{SPOTIFY_PLAYER_URL}/play"
 
@@ -129,7 +119,7 @@ def play():
     if device_id:
         url += f"?device_id={device_id}"
 
-    response = requests.put(url, headers = headers, json = {'uris': [track_uri]})
+    response = get_client().put(url, access_token = access_token, json = {'uris': [track_uri]})
 
     if response.status_code != 204:
         return get_error(response)
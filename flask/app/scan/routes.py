@@ -1,16 +1,15 @@
 from os import environ
-import mysql.connector
+
 from flask import render_template, request, session, redirect, url_for, jsonify
 
-from spotify.album import AlbumDAO
-from spotify.artist import ArtistDAO
-from spotify.playlist import PlaylistDAO
-from spotify.playlist_scan import PlaylistScanDAO
-from spotify.track import TrackDAO
-from spotify.user import UserDAO
+from spotify import database
+from ..cache import TTLCache
 from . import scan_bp
 import spotify.api
 
+# Playlist of a scan by scan id, a scan never moves to another playlist so only title and cover changes go stale
+playlist_cache = TTLCache(ttl = float(environ.get("SCAN_PLAYLIST_CACHE_TTL", 60)), max_entries = 1024)
+
 @scan_bp.route('/')
 def scan():
     access_token = session.get('access_token')
@@ -27,20 +26,16 @@ def stop():
     if not scan_id:
         return jsonify({"error": "Task ID is required"}), 400
 
-    with mysql.connector.connect(
-            host = environ["MYSQL_HOST"],
-            user = environ["MYSQL_USER"],
-            password = environ["MYSQL_PASSWORD"],
-            database = environ["MYSQL_DATABASE"]
-    ) as connection:
-        # Create DAO instances
-        artist_dao = ArtistDAO(connection)
-        album_dao = AlbumDAO(connection, artist_dao)
-        track_dao = TrackDAO(connection, album_dao, artist_dao)
-        user_dao = UserDAO(connection)
-        playlist_dao = PlaylistDAO(connection)
-        playlist_scan_dao = PlaylistScanDAO(connection, playlist_dao, user_dao, track_dao)
-
-        playlist_scan = playlist_scan_dao.get_instance(scan_id, False)
-
-    return jsonify(playlist_scan.playlist.export_attributes()), 200
+    # Card scans only need the playlist of the scan, not its tracks
+    playlist_attributes = playlist_cache.get(scan_id)
+    if playlist_attributes is None:
+        with database.connect() as daos:
+            playlist = daos.playlist_dao.get_instance_from_scan(scan_id)
+
+        if not playlist:
+            return jsonify({"error": "Scan not found"}), 404
+
+        playlist_attributes = playlist.export_attributes()
+        playlist_cache.put(scan_id, playlist_attributes)
+
+    return jsonify(playlist_attributes), 200
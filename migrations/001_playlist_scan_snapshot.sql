@@ -0,0 +1,5 @@
+-- Delta scans: store the Spotify snapshot_id of every scan, and whether a scan only holds the tracks added since the
+-- scan it extends (extends_playlist_scan)
+ALTER TABLE playlist_scan
+    ADD COLUMN IF NOT EXISTS snapshot_id VARCHAR(255) DEFAULT NULL,
+    ADD COLUMN IF NOT EXISTS delta_scan BOOLEAN NOT NULL DEFAULT FALSE;
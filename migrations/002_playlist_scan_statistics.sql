@@ -0,0 +1,16 @@
+-- Precomputed track counts of a scan, the statistics of existing scans are computed the first time they are requested
+CREATE TABLE IF NOT EXISTS playlist_scan_statistics (
+    playlist_scan_id UUID NOT NULL PRIMARY KEY,
+    amount_of_tracks INT NOT NULL,
+    amount_of_unique_tracks INT NOT NULL,
+    FOREIGN KEY (playlist_scan_id) REFERENCES playlist_scan(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS playlist_scan_statistics_bucket (
+    playlist_scan_id UUID NOT NULL,
+    track_added_at TIMESTAMP NOT NULL,
+    amount_of_tracks INT NOT NULL,
+    amount_of_unique_tracks INT NOT NULL,
+    PRIMARY KEY (playlist_scan_id, track_added_at),
+    FOREIGN KEY (playlist_scan_id) REFERENCES playlist_scan(id) ON DELETE CASCADE
+);
@@ -0,0 +1,14 @@
+-- Covering indexes for the access paths of the DAO queries
+
+-- Scans of a playlist: the scans to extend from (export_completed) and the latest scan (timestamp)
+CREATE INDEX IF NOT EXISTS idx_playlist_scan_playlist_export ON playlist_scan (playlist_id, export_completed);
+CREATE INDEX IF NOT EXISTS idx_playlist_scan_playlist_timestamp ON playlist_scan (playlist_id, timestamp);
+
+-- Artists of a track
+CREATE INDEX IF NOT EXISTS idx_artist_track_track ON artist_track (track_id, artist_id);
+
+-- Tracks of a scan in playlist order, and the tracks of a scan added after a moment
+CREATE INDEX IF NOT EXISTS idx_playlist_scan_track_order
+    ON playlist_scan_track (playlist_scan_id, track_playlist_scan_index, track_id);
+CREATE INDEX IF NOT EXISTS idx_playlist_scan_track_added_at
+    ON playlist_scan_track (playlist_scan_id, track_added_at, track_id);
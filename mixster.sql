@@ -22,9 +22,13 @@ CREATE TABLE playlist_scan (
     export_completed BOOLEAN NOT NULL,
     extends_playlist_scan UUID DEFAULT NULL,
     timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    snapshot_id VARCHAR(255) DEFAULT NULL,
+    delta_scan BOOLEAN NOT NULL DEFAULT FALSE,
     FOREIGN KEY (extends_playlist_scan) REFERENCES playlist_scan(id) ON DELETE CASCADE,
     FOREIGN KEY (requested_by_user_id) REFERENCES user(id) ON DELETE CASCADE,
-    FOREIGN KEY (playlist_id) REFERENCES playlist(id) ON DELETE CASCADE
+    FOREIGN KEY (playlist_id) REFERENCES playlist(id) ON DELETE CASCADE,
+    INDEX idx_playlist_scan_playlist_export (playlist_id, export_completed),
+    INDEX idx_playlist_scan_playlist_timestamp (playlist_id, timestamp)
 );
 
 -- Create the `artist` table
@@ -54,7 +58,8 @@ CREATE TABLE artist_track (
     track_id VARCHAR(255) NOT NULL,
     PRIMARY KEY (artist_id, track_id),
     FOREIGN KEY (artist_id) REFERENCES artist(id) ON DELETE CASCADE,
-    FOREIGN KEY (track_id) REFERENCES track(id) ON DELETE CASCADE
+    FOREIGN KEY (track_id) REFERENCES track(id) ON DELETE CASCADE,
+    INDEX idx_artist_track_track (track_id, artist_id)
 );
 
 -- Create the relationship between `playlist_scan` and `track` (many-to-many)
@@ -65,5 +70,25 @@ CREATE TABLE playlist_scan_track (
     track_added_at TIMESTAMP NOT NULL,
     PRIMARY KEY (playlist_scan_id, track_id, track_playlist_scan_index),
     FOREIGN KEY (playlist_scan_id) REFERENCES playlist_scan(id) ON DELETE CASCADE,
-    FOREIGN KEY (track_id) REFERENCES track(id) ON DELETE CASCADE
-);
\ No newline at end of file
+    FOREIGN KEY (track_id) REFERENCES track(id) ON DELETE CASCADE,
+    INDEX idx_playlist_scan_track_order (playlist_scan_id, track_playlist_scan_index, track_id),
+    INDEX idx_playlist_scan_track_added_at (playlist_scan_id, track_added_at, track_id)
+);
+
+-- Precomputed track counts of a scan, including the tracks a delta scan inherits
+CREATE TABLE playlist_scan_statistics (
+    playlist_scan_id UUID NOT NULL PRIMARY KEY,
+    amount_of_tracks INT NOT NULL,
+    amount_of_unique_tracks INT NOT NULL,
+    FOREIGN KEY (playlist_scan_id) REFERENCES playlist_scan(id) ON DELETE CASCADE
+);
+
+-- The track counts of a scan bucketed by track_added_at, amount_of_unique_tracks counts the tracks last added then
+CREATE TABLE playlist_scan_statistics_bucket (
+    playlist_scan_id UUID NOT NULL,
+    track_added_at TIMESTAMP NOT NULL,
+    amount_of_tracks INT NOT NULL,
+    amount_of_unique_tracks INT NOT NULL,
+    PRIMARY KEY (playlist_scan_id, track_added_at),
+    FOREIGN KEY (playlist_scan_id) REFERENCES playlist_scan(id) ON DELETE CASCADE
+);
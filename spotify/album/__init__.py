@@ -1,33 +1,61 @@
+import threading
+import weakref
 from time import time
 
 from mysql.connector.abstracts import MySQLConnectionAbstract
 from mysql.connector.pooling import PooledMySQLConnection
+
+import spotify.utilities as utilities
 from spotify.artist import Artist, ArtistDAO
+from spotify.identity import IdentityMap
 
 
 class Album:
+    __slots__ = ('id', 'title', 'release_year', '__weakref__')
+
+    # Instances alive in the process by (id, title, release year), so equal albums built from the API share one instance
+    __interned = weakref.WeakValueDictionary()
+    __interned_lock = threading.Lock()
+
     def __init__(self, album_id: str, title: str, release_year: int):
         self.id = album_id
         self.title = title
         self.release_year = release_year
 
+    @classmethod
+    def intern(cls, album_id: str, title: str, release_year: int) -> 'Album':
+        """Returns the instance with this id, title and release year if one is alive, creating it otherwise."""
+        with cls.__interned_lock:
+            album = cls.__interned.get((album_id, title, release_year))
+            if album is None:
+                album = cls(album_id, title, release_year)
+                cls.__interned[(album_id, title, release_year)] = album
+            return album
+
     def __repr__(self):
         return f"<Album(id={self.id}, title={self.title}, release_year={self.release_year})>"
 
 class AlbumDAO:
-    def __init__(self, connection: PooledMySQLConnection | MySQLConnectionAbstract, artist_dao: ArtistDAO):
+    def __init__(self, connection: PooledMySQLConnection | MySQLConnectionAbstract, artist_dao: ArtistDAO,
+                 identity_map: IdentityMap = None):
         """
         Initialize the DAO with a database connection and related dao's
         :param artist_dao Instance of ArtistDAO to handle artist (data) related operations
+        :param identity_map: The identity map of the unit of work, defaults to the one of the ArtistDAO.
         """
         self.connection = connection
         self.artist_dao = artist_dao
+        self.identity_map = identity_map if identity_map is not None else artist_dao.identity_map
 
     def put_instance(self, album: Album):
         """
         Inserts or updates an Album and its related album in the database.
         :param album: An Album object containing the album data.
         """
+        # Albums are never updated, so a stored album needs no round trip at all
+        if self.identity_map.is_stored('album', album.id):
+            return
+
         try:
             cursor = self.connection.cursor()
 
@@ -47,10 +75,42 @@ class AlbumDAO:
 
                 # Commit the transaction
                 self.connection.commit()
+                self.identity_map.commit()
+
+            self.identity_map.mark_stored('album', album.id)
 
         except Exception as e:
             print(f"Error: {e}")
             self.connection.rollback()
+            self.identity_map.rollback()
+        finally:
+            cursor.close()
+
+    def put_instances(self, albums: list[Album]):
+        """
+        Inserts multiple albums using batched multi-row statements, existing albums are left untouched.
+        Does not commit, the caller is in charge of the transaction.
+        :param albums: The Album objects to store, duplicates are only written once.
+        """
+        unique_albums = [
+            album for album in {album.id: album for album in albums}.values()
+            if not self.identity_map.is_stored('album', album.id)
+        ]
+        if not unique_albums:
+            return
+
+        cursor = self.connection.cursor()
+        try:
+            insert_query = """
+            INSERT INTO album (id, title, release_year)
+            VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE id = id
+            """
+            for batch in utilities.chunked(unique_albums):
+                cursor.executemany(insert_query, [(album.id, album.title, album.release_year) for album in batch])
+
+            for album in unique_albums:
+                self.identity_map.mark_stored('album', album.id, pending = True)
         finally:
             cursor.close()
 
@@ -60,6 +120,10 @@ class AlbumDAO:
         :param album_id: The ID of the album to retrieve.
         :return: An Album instance, or None if not found.
         """
+        album = self.identity_map.get('album', album_id)
+        if album:
+            return album
+
         try:
             cursor = self.connection.cursor(dictionary = True)
 
@@ -76,11 +140,13 @@ class AlbumDAO:
                 return None  # Album not found
 
             # Construct and return the Album instance
-            return Album(
+            album = Album(
                 album_id = album_data["id"],
                 title = album_data["title"],
                 release_year = album_data["release_year"]
             )
+            self.identity_map.add('album', album.id, album)
+            return album
 
         except Exception as e:
             print(f"Error fetching album instance: {e}")
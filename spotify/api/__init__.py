@@ -1 +1,2 @@
-from .authenticate import Authenticate
\ No newline at end of file
+from .authenticate import Authenticate
+from .client import SpotifyClient, get_client
\ No newline at end of file
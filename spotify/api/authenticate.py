@@ -1,10 +1,9 @@
 import time
 from datetime import datetime
 
-import mysql.connector
-import requests
 from os import environ
-from spotify.user import User, UserDAO
+from spotify.user import User
+from .client import get_client
 
 # Spotify API constants
 
@@ -28,7 +27,7 @@ class Authenticate:
     def __init__(self, code=None, access_token=None):
         if code:
             # Authenticate
-            auth_response = requests.post(SPOTIFY_TOKEN_URL, data = {
+            auth_response = get_client().post(SPOTIFY_TOKEN_URL, data = {
                 'grant_type': 'authorization_code',
                 'code': code,
                 'redirect_uri': SPOTIFY_REDIRECT_URI,
@@ -47,23 +46,17 @@ class Authenticate:
 
     def get_user(self) -> User:
         """Fetches the user's profile information and updates the database"""
-        headers = {
-            'Authorization': f'Bearer {self.__access_token}'
-        }
+        # Import inside function to combat circular import error
+        from spotify import database
 
-        response = requests.get(SPOTIFY_USER_PROFILE_URL, headers = headers)
+        response = get_client().get(SPOTIFY_USER_PROFILE_URL, access_token = self.__access_token)
         if response.status_code != 200:
             raise RuntimeError(f"Error fetching user profile: {response.status_code}, {response.text}")
 
         user_data = response.json()
 
-        with mysql.connector.connect(
-                host = environ["MYSQL_HOST"],
-                user = environ["MYSQL_USER"],
-                password = environ["MYSQL_PASSWORD"],
-                database = environ["MYSQL_DATABASE"]
-        ) as connection:
-            user_dao = UserDAO(connection)
+        with database.connect() as daos:
+            user_dao = daos.user_dao
 
             # Get registry_date or get current date if not found
             user_db = user_dao.get_instance(user_data.get('id'))
@@ -0,0 +1,177 @@
+import random
+import threading
+from contextlib import nullcontext
+from os import environ, getpid
+from time import sleep
+from urllib.parse import urlparse
+
+import redis
+import requests
+from requests.adapters import HTTPAdapter
+
+from .rate_limit import TokenBucket, AdaptiveConcurrency
+
+# Maximum amount of connections kept alive per host, should cover the concurrent page fetches of a scan
+POOL_SIZE = int(environ.get("SPOTIFY_POOL_SIZE", 10))
+
+# Seconds to wait for a connection to be set up, and for the server to send data
+CONNECT_TIMEOUT = float(environ.get("SPOTIFY_CONNECT_TIMEOUT", 3.05))
+READ_TIMEOUT = float(environ.get("SPOTIFY_READ_TIMEOUT", 15))
+
+# Retries of a throttled (429) or failed (5xx, connection error) request, and the bounds of the backoff between them
+MAX_RETRIES = int(environ.get("SPOTIFY_MAX_RETRIES", 5))
+BACKOFF_BASE = float(environ.get("SPOTIFY_BACKOFF_BASE", 0.5))
+BACKOFF_MAX = float(environ.get("SPOTIFY_BACKOFF_MAX", 30))
+
+# A Retry-After longer than this is not waited for, the throttled response is returned instead
+MAX_RETRY_AFTER = float(environ.get("SPOTIFY_MAX_RETRY_AFTER", 120))
+
+# Requests per second (and burst size) shared by every process, through a token bucket in redis.
+# The bucket is only used when a redis url is configured and a rate is set
+RATE_LIMIT = float(environ.get("SPOTIFY_RATE_LIMIT", 10))
+RATE_LIMIT_BURST = float(environ.get("SPOTIFY_RATE_LIMIT_BURST", 20))
+RATE_LIMIT_REDIS_URL = environ.get("SPOTIFY_RATE_LIMIT_REDIS_URL", environ.get("CELERY_BROKER_URL"))
+RATE_LIMIT_KEY = "spotify_rate_limit"
+
+# Upper bound of the requests a process has in flight, the actual limit adapts to throttling
+MAX_CONCURRENCY = int(environ.get("SPOTIFY_MAX_CONCURRENCY", POOL_SIZE))
+
+# Hosts whose requests draw from the request budget and count towards the adaptive concurrency. Logins
+# (accounts.spotify.com) and scraped pages (open.spotify.com) are throttled separately, so they never wait behind scans
+RATE_LIMITED_HOSTS = ("api.spotify.com",)
+
+# Server errors worth another try, only for requests that are safe to repeat
+RETRY_STATUS_CODES = (500, 502, 503, 504)
+IDEMPOTENT_METHODS = ("GET", "HEAD", "PUT", "DELETE")
+
+
+class SpotifyClient:
+    def __init__(self, pool_size: int = POOL_SIZE, timeout: tuple[float, float] = (CONNECT_TIMEOUT, READ_TIMEOUT),
+                 token_bucket: TokenBucket = None, max_retries: int = MAX_RETRIES):
+        """
+        HTTP client shared by all the Spotify calls of a process.
+        Connections are pooled and kept alive, so only the first request to a host pays for the TLS handshake.
+        Throttled requests are retried after the Retry-After Spotify sends, other failures after a jittered
+        exponential backoff. Requests to the Web API (RATE_LIMITED_HOSTS) draw from the token bucket, and every 429
+        they get halves the amount of them the process has in flight.
+        :param pool_size: The maximum amount of connections kept alive per host.
+        :param timeout: The default (connect, read) timeout in seconds of every request.
+        :param token_bucket: Request budget shared with other processes, None to not limit the request rate.
+        """
+        self.timeout = timeout
+        self.token_bucket = token_bucket
+        self.max_retries = max_retries
+        self.concurrency = AdaptiveConcurrency(initial = MAX_CONCURRENCY, maximum = MAX_CONCURRENCY)
+
+        adapter = HTTPAdapter(pool_connections = 4, pool_maxsize = max(pool_size, MAX_CONCURRENCY))
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Accept-Encoding": "gzip, deflate",
+            "Connection": "keep-alive"
+        })
+
+    def request(self, method: str, url: str, access_token: str = None, **kwargs) -> requests.Response:
+        """
+        Sends a request over the pooled session.
+        :param access_token: Sent as bearer token in the Authorization header when given.
+        :param kwargs: Passed on to requests, e.g. headers, params, data or json.
+        """
+        if access_token:
+            kwargs['headers'] = {'Authorization': f'Bearer {access_token}', **kwargs.get('headers', {})}
+        kwargs.setdefault('timeout', self.timeout)
+
+        retryable = method.upper() in IDEMPOTENT_METHODS
+        rate_limited = urlparse(url).hostname in RATE_LIMITED_HOSTS
+        attempt = 0
+        while True:
+            if rate_limited:
+                self.__wait_for_token()
+
+            try:
+                with self.concurrency if rate_limited else nullcontext():
+                    response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                sleep(self.__backoff(attempt))
+                attempt += 1
+                continue
+
+            if response.status_code == 429:
+                if rate_limited:
+                    self.concurrency.on_throttle()
+                retry_after = self.__retry_after(response, attempt)
+                if attempt >= self.max_retries or retry_after > MAX_RETRY_AFTER:
+                    return response
+
+                # Make the other processes hold off as well
+                if rate_limited and self.token_bucket is not None:
+                    self.token_bucket.block(retry_after)
+                sleep(retry_after)
+            elif response.status_code in RETRY_STATUS_CODES and retryable and attempt < self.max_retries:
+                sleep(self.__backoff(attempt))
+            else:
+                if rate_limited and response.status_code < 400:
+                    self.concurrency.on_success()
+                return response
+
+            attempt += 1
+
+    def __wait_for_token(self):
+        if self.token_bucket is None:
+            return
+
+        wait = self.token_bucket.try_acquire()
+        while wait > 0:
+            # Jitter, so the processes waiting on the bucket do not all retry at the same moment
+            sleep(wait * random.uniform(1, 1.5))
+            wait = self.token_bucket.try_acquire()
+
+    @staticmethod
+    def __backoff(attempt: int) -> float:
+        """Exponential backoff with full jitter."""
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+    @staticmethod
+    def __retry_after(response: requests.Response, attempt: int) -> float:
+        """The seconds Spotify asks to wait, plus some jitter, or a backoff when it did not say."""
+        try:
+            return float(response.headers['Retry-After']) + random.uniform(0, 1)
+        except (KeyError, ValueError):
+            return SpotifyClient.__backoff(attempt)
+
+    def get(self, url: str, access_token: str = None, **kwargs) -> requests.Response:
+        return self.request("GET", url, access_token, **kwargs)
+
+    def post(self, url: str, access_token: str = None, **kwargs) -> requests.Response:
+        return self.request("POST", url, access_token, **kwargs)
+
+    def put(self, url: str, access_token: str = None, **kwargs) -> requests.Response:
+        return self.request("PUT", url, access_token, **kwargs)
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> SpotifyClient:
+    """
+    Returns the Spotify client of this process.
+    The client is created lazily and recreated after a fork, so forked (Celery) workers never share sockets.
+    """
+    global _client, _client_pid
+
+    with _client_lock:
+        if _client is None or _client_pid != getpid():
+            token_bucket = None
+            if RATE_LIMIT_REDIS_URL and RATE_LIMIT > 0:
+                token_bucket = TokenBucket(redis.Redis.from_url(RATE_LIMIT_REDIS_URL), RATE_LIMIT_KEY,
+                                           rate = RATE_LIMIT, capacity = RATE_LIMIT_BURST)
+
+            _client = SpotifyClient(token_bucket = token_bucket)
+            _client_pid = getpid()
+
+        return _client
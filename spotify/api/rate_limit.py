@@ -0,0 +1,139 @@
+import threading
+from time import time
+
+import redis
+
+# Refills the bucket for the time passed since the last call and takes a token if there is one.
+# Returns the seconds to wait before trying again, 0 when a token was taken.
+# Floats are returned as strings, redis truncates Lua numbers to integers.
+TAKE_TOKEN_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'timestamp', 'blocked_until')
+local tokens = tonumber(state[1]) or capacity
+local timestamp = tonumber(state[2]) or now
+local blocked_until = tonumber(state[3]) or 0
+
+if blocked_until > now then
+    return tostring(blocked_until - now)
+end
+
+tokens = math.min(capacity, tokens + math.max(0, now - timestamp) * rate)
+
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'timestamp', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+return tostring(wait)
+"""
+
+# Moves the moment the bucket hands out tokens again forward, never backward
+BLOCK_SCRIPT = """
+local blocked_until = tonumber(redis.call('HGET', KEYS[1], 'blocked_until')) or 0
+if tonumber(ARGV[1]) > blocked_until then
+    redis.call('HSET', KEYS[1], 'blocked_until', ARGV[1])
+    redis.call('EXPIRE', KEYS[1], math.ceil(tonumber(ARGV[2])) + 60)
+end
+return 1
+"""
+
+
+class TokenBucket:
+    # Seconds the bucket is bypassed after redis could not be reached
+    unavailable_backoff = 30
+
+    def __init__(self, redis_client, key: str, rate: float, capacity: float):
+        """
+        Token bucket kept in redis, so every process and worker draws from the same request budget.
+        The bucket fails open, when redis can not be reached requests go through unlimited.
+        :param rate: Tokens added per second, the sustained amount of requests per second.
+        :param capacity: The maximum amount of tokens, the amount of requests that may be sent in a burst.
+        """
+        self.redis_client = redis_client
+        self.key = key
+        self.rate = rate
+        self.capacity = capacity
+
+        self.__take_token = redis_client.register_script(TAKE_TOKEN_SCRIPT)
+        self.__block = redis_client.register_script(BLOCK_SCRIPT)
+        self.__unavailable_until = 0
+
+    def __available(self) -> bool:
+        return time() >= self.__unavailable_until
+
+    def __mark_unavailable(self, e: redis.RedisError):
+        print(f"Error reaching the rate limiter, continuing without it: {e}")
+        self.__unavailable_until = time() + TokenBucket.unavailable_backoff
+
+    def try_acquire(self) -> float:
+        """
+        Takes a token if one is available.
+        :return: The seconds to wait before trying again, 0 when a token was taken.
+        """
+        if not self.__available():
+            return 0
+
+        try:
+            return float(self.__take_token(keys = [self.key], args = [self.rate, self.capacity, time()]))
+        except redis.RedisError as e:
+            self.__mark_unavailable(e)
+            return 0
+
+    def block(self, seconds: float):
+        """Hands out no tokens for the coming seconds, to every process, e.g. after Spotify sent a Retry-After."""
+        if not self.__available():
+            return
+
+        try:
+            self.__block(keys = [self.key], args = [time() + seconds, seconds])
+        except redis.RedisError as e:
+            self.__mark_unavailable(e)
+
+
+class AdaptiveConcurrency:
+    def __init__(self, initial: int, maximum: int, minimum: int = 1):
+        """
+        Limits the amount of requests in flight, adapting the limit with additive increase/multiplicative decrease.
+        Every request that is not throttled grows the limit by 1/limit (so by one per round of requests),
+        every throttled request halves it.
+        """
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(max(minimum, min(initial, maximum)))
+
+        self.__in_flight = 0
+        self.__condition = threading.Condition()
+
+    def acquire(self):
+        with self.__condition:
+            while self.__in_flight >= int(self.limit):
+                self.__condition.wait()
+            self.__in_flight += 1
+
+    def release(self):
+        with self.__condition:
+            self.__in_flight -= 1
+            self.__condition.notify_all()
+
+    def on_success(self):
+        with self.__condition:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self.__condition.notify_all()
+
+    def on_throttle(self):
+        with self.__condition:
+            self.limit = max(self.minimum, self.limit / 2)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
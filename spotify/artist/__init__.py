@@ -1,28 +1,56 @@
+import threading
+import weakref
+
 from mysql.connector.abstracts import MySQLConnectionAbstract
 from mysql.connector.pooling import PooledMySQLConnection
 
+import spotify.utilities as utilities
+from spotify.identity import IdentityMap
+
 
 class Artist:
+    __slots__ = ('id', 'name', '__weakref__')
+
+    # Instances alive in the process by (id, name), so equal artists built from the API share one instance
+    __interned = weakref.WeakValueDictionary()
+    __interned_lock = threading.Lock()
+
     def __init__(self, artist_id: str, name: str):
         self.id = artist_id
         self.name = name
 
+    @classmethod
+    def intern(cls, artist_id: str, name: str) -> 'Artist':
+        """Returns the instance with this id and name if one is alive, creating it otherwise."""
+        with cls.__interned_lock:
+            artist = cls.__interned.get((artist_id, name))
+            if artist is None:
+                artist = cls(artist_id, name)
+                cls.__interned[(artist_id, name)] = artist
+            return artist
+
     def __repr__(self):
         return f"<Artist(id={self.id}, name={self.name})>"
 
 
 class ArtistDAO:
-    def __init__(self, connection: PooledMySQLConnection | MySQLConnectionAbstract):
+    def __init__(self, connection: PooledMySQLConnection | MySQLConnectionAbstract, identity_map: IdentityMap = None):
         """
         Initialize the DAO with a database connection
+        :param identity_map: The identity map of the unit of work the DAO is part of, a new one when not given.
         """
         self.connection = connection
+        self.identity_map = identity_map if identity_map is not None else IdentityMap()
 
     def put_instance(self, artist: Artist):
         """
         Inserts or updates an artist in the database.
         :param artist: An Artist object containing the artist data.
         """
+        # Already written with the same name in this unit of work
+        if self.identity_map.is_stored('artist', artist.id, artist.name):
+            return
+
         try:
             cursor = self.connection.cursor()
 
@@ -41,10 +69,41 @@ class ArtistDAO:
 
             # Commit the transaction
             self.connection.commit()
+            self.identity_map.commit()
+            self.identity_map.mark_stored('artist', artist.id, artist.name)
 
         except Exception as e:
             print(f"Error: {e}")
             self.connection.rollback()
+            self.identity_map.rollback()
+        finally:
+            cursor.close()
+
+    def put_instances(self, artists: list[Artist]):
+        """
+        Inserts or updates multiple artists using batched multi-row statements.
+        Does not commit, the caller is in charge of the transaction.
+        :param artists: The Artist objects to store, duplicates are only written once.
+        """
+        unique_artists = [
+            artist for artist in {artist.id: artist for artist in artists}.values()
+            if not self.identity_map.is_stored('artist', artist.id, artist.name)
+        ]
+        if not unique_artists:
+            return
+
+        cursor = self.connection.cursor()
+        try:
+            insert_query = """
+            INSERT INTO artist (id, name)
+            VALUES (%s, %s)
+            ON DUPLICATE KEY UPDATE name = VALUES(name)
+            """
+            for batch in utilities.chunked(unique_artists):
+                cursor.executemany(insert_query, [(artist.id, artist.name) for artist in batch])
+
+            for artist in unique_artists:
+                self.identity_map.mark_stored('artist', artist.id, artist.name, pending = True)
         finally:
             cursor.close()
 
@@ -54,6 +113,10 @@ class ArtistDAO:
         :param artist_id: The ID of the artist to retrieve.
         :return: An Artist instance, or None if not found.
         """
+        artist = self.identity_map.get('artist', artist_id)
+        if artist:
+            return artist
+
         try:
             cursor = self.connection.cursor(dictionary = True)
 
@@ -70,10 +133,12 @@ class ArtistDAO:
                 return None  # Artist not found
 
             # Construct and return the Artist instance
-            return Artist(
+            artist = Artist(
                 artist_id = artist_data["id"],
                 name = artist_data["name"]
             )
+            self.identity_map.add('artist', artist.id, artist)
+            return artist
 
         except Exception as e:
             print(f"Error fetching artist instance: {e}")
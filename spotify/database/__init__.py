@@ -0,0 +1,157 @@
+import threading
+from contextlib import contextmanager
+from os import environ, getpid
+from time import time, sleep
+
+from mysql.connector import errors
+from mysql.connector.pooling import MySQLConnectionPool, PooledMySQLConnection
+
+from spotify import identity
+from spotify.album import AlbumDAO
+from spotify.artist import ArtistDAO
+from spotify.playlist import PlaylistDAO
+from spotify.playlist_scan import PlaylistScanDAO
+from spotify.track import TrackDAO
+from spotify.user import UserDAO
+
+# Size of the connection pool of this process, the web and worker containers each set their own
+POOL_SIZE = int(environ.get("MYSQL_POOL_SIZE", 5))
+
+# Seconds to wait for a free connection before giving up
+POOL_TIMEOUT = float(environ.get("MYSQL_POOL_TIMEOUT", 10))
+
+# Seconds between checkout attempts while the pool is exhausted
+POOL_RETRY_INTERVAL = 0.01
+
+
+class PoolMetrics:
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.checkouts = 0
+        self.waited_checkouts = 0
+        self.timeouts = 0
+        self.failed_health_checks = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    def record_checkout(self, wait_time: float, waited: bool):
+        with self.__lock:
+            self.checkouts += 1
+            self.total_wait_time += wait_time
+            self.max_wait_time = max(self.max_wait_time, wait_time)
+            if waited:
+                self.waited_checkouts += 1
+
+    def record_timeout(self):
+        with self.__lock:
+            self.timeouts += 1
+
+    def record_failed_health_check(self):
+        with self.__lock:
+            self.failed_health_checks += 1
+
+    def export_attributes(self):
+        with self.__lock:
+            return {
+                'pid': getpid(),
+                'pool_size': POOL_SIZE,
+                'checkouts': self.checkouts,
+                'waited_checkouts': self.waited_checkouts,
+                'timeouts': self.timeouts,
+                'failed_health_checks': self.failed_health_checks,
+                'total_wait_time': self.total_wait_time,
+                'average_wait_time': self.total_wait_time / self.checkouts if self.checkouts else 0.0,
+                'max_wait_time': self.max_wait_time
+            }
+
+
+class DAOs:
+    def __init__(self, connection: PooledMySQLConnection):
+        """
+        Bundle of all the DAOs, wired up around a single database connection.
+        The bundle is a unit of work, its DAOs share one identity map.
+        """
+        self.connection = connection
+        self.identity_map = identity.IdentityMap()
+        self.artist_dao = ArtistDAO(connection, self.identity_map)
+        self.album_dao = AlbumDAO(connection, self.artist_dao, self.identity_map)
+        self.track_dao = TrackDAO(connection, self.album_dao, self.artist_dao, self.identity_map)
+        self.user_dao = UserDAO(connection)
+        self.playlist_dao = PlaylistDAO(connection)
+        self.playlist_scan_dao = PlaylistScanDAO(connection, self.playlist_dao, self.user_dao, self.track_dao)
+
+
+metrics = PoolMetrics()
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> MySQLConnectionPool:
+    """
+    Returns the connection pool of this process.
+    The pool is created lazily and recreated after a fork, so forked (Celery) workers never share sockets.
+    """
+    global _pool, _pool_pid
+
+    with _pool_lock:
+        if _pool is None or _pool_pid != getpid():
+            _pool = MySQLConnectionPool(
+                pool_name = f"mixster_{getpid()}",
+                pool_size = POOL_SIZE,
+                host = environ["MYSQL_HOST"],
+                user = environ["MYSQL_USER"],
+                password = environ["MYSQL_PASSWORD"],
+                database = environ["MYSQL_DATABASE"]
+            )
+            _pool_pid = getpid()
+
+        return _pool
+
+
+def get_connection() -> PooledMySQLConnection:
+    """
+    Checks out a connection from the pool, waiting up to POOL_TIMEOUT seconds for one to become available.
+    On checkout the pool checks the health of the connection and reconnects it if the server dropped it.
+    Closing the returned connection hands it back to the pool.
+    """
+    pool = get_pool()
+    start_time = time()
+    waited = False
+
+    while True:
+        try:
+            connection = pool.get_connection()
+            break
+        except errors.PoolError:
+            # Pool exhausted, wait for a connection to be handed back
+            pass
+        except (errors.InterfaceError, errors.OperationalError):
+            # The connection failed its health check and could not be reconnected
+            metrics.record_failed_health_check()
+
+        if time() - start_time > POOL_TIMEOUT:
+            metrics.record_timeout()
+            raise errors.PoolError(f"No database connection available within {POOL_TIMEOUT} seconds")
+
+        waited = True
+        sleep(POOL_RETRY_INTERVAL)
+
+    metrics.record_checkout(time() - start_time, waited)
+    return connection
+
+
+@contextmanager
+def connect():
+    """
+    Context manager handing out a ready-made DAOs bundle on a pooled connection.
+
+    with database.connect() as daos:
+        daos.playlist_scan_dao.get_instance(playlist_scan_id)
+    """
+    connection = get_connection()
+    try:
+        yield DAOs(connection)
+    finally:
+        connection.close()
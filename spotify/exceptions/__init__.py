@@ -6,3 +6,9 @@ class URLError(Exception):
 class PlaylistException(Exception):
     def __init__(self, message):
         super().__init__(message)
+
+
+class SpotifyAPIError(RuntimeError):
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
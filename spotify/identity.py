@@ -0,0 +1,135 @@
+import threading
+from collections import OrderedDict
+from os import environ
+
+# Maximum amount of entity ids a process remembers as stored
+KNOWN_IDS_SIZE = int(environ.get("KNOWN_IDS_CACHE_SIZE", 50000))
+
+
+class KnownIds:
+    def __init__(self, max_entries: int = KNOWN_IDS_SIZE):
+        """
+        Process-wide LRU of the (entity, id) pairs known to be stored in the database, shared by every unit of work.
+        Entities are never deleted by the app, so an id once stored stays valid.
+        """
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def __contains__(self, key: tuple[str, str]) -> bool:
+        with self.__lock:
+            if key in self.__entries:
+                self.__entries.move_to_end(key)
+                self.hits += 1
+                return True
+
+            self.misses += 1
+            return False
+
+    def add_all(self, keys):
+        with self.__lock:
+            for key in keys:
+                self.__entries[key] = True
+                self.__entries.move_to_end(key)
+            while len(self.__entries) > self.max_entries:
+                self.__entries.popitem(last = False)
+
+    def stats(self) -> dict:
+        with self.__lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.__entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0
+            }
+
+
+class IdentityMapMetrics:
+    def __init__(self):
+        """Lookups of all the identity maps of the process, by kind: 'get' (loaded instances) or 'put' (writes)."""
+        self.__lock = threading.Lock()
+        self.__lookups = {}
+
+    def record(self, kind: str, hit: bool):
+        with self.__lock:
+            hits, misses = self.__lookups.get(kind, (0, 0))
+            self.__lookups[kind] = (hits + hit, misses + (not hit))
+
+    def export_attributes(self) -> dict:
+        with self.__lock:
+            return {
+                kind: {
+                    'hits': hits,
+                    'misses': misses,
+                    'hit_ratio': hits / (hits + misses) if hits + misses else 0.0
+                } for kind, (hits, misses) in self.__lookups.items()
+            }
+
+
+known_ids = KnownIds()
+metrics = IdentityMapMetrics()
+
+
+class IdentityMap:
+    def __init__(self, known: KnownIds = None):
+        """
+        Identity map of a unit of work (a DAOs bundle), shared by the ArtistDAO, AlbumDAO and TrackDAO in it.
+        Instances loaded once are handed out again without a query, and entities written once are not written again.
+        Writes within a transaction only count as stored once the transaction is committed.
+        :param known: The ids known to be stored, shared across units of work. Defaults to the ids of the process.
+        """
+        self.known_ids = known if known is not None else known_ids
+        self.__instances = {}
+        self.__stored = {}
+        self.__pending = {}
+
+    def get(self, entity: str, entity_id: str):
+        """:return: The instance loaded earlier in this unit of work, or None."""
+        instance = self.__instances.get((entity, entity_id))
+        metrics.record('get', instance is not None)
+        return instance
+
+    def add(self, entity: str, entity_id: str, instance):
+        """Remembers an instance loaded from the database, which is stored by definition."""
+        self.__instances[(entity, entity_id)] = instance
+        self.__stored.setdefault((entity, entity_id), None)
+        self.known_ids.add_all([(entity, entity_id)])
+
+    def is_stored(self, entity: str, entity_id: str, value=None) -> bool:
+        """
+        Whether writing the entity can be skipped.
+        :param value: The data the entity would be written with (e.g. the name of an artist). Without a value any
+        stored entity counts, with a value only an entity written with the same value in this unit of work.
+        """
+        key = (entity, entity_id)
+        if value is None:
+            stored = key in self.__stored or key in self.__pending or key in self.known_ids
+        else:
+            stored = self.__stored.get(key, self.__pending.get(key)) == value
+        metrics.record('put', stored)
+        return stored
+
+    def mark_stored(self, entity: str, entity_id: str, value=None, pending: bool = False):
+        """
+        Remembers a written entity.
+        :param pending: Whether it was written in a transaction that is not committed yet.
+        """
+        if pending:
+            self.__pending[(entity, entity_id)] = value
+        else:
+            self.__stored[(entity, entity_id)] = value
+            self.known_ids.add_all([(entity, entity_id)])
+
+    def commit(self):
+        """The transaction was committed, its writes are stored."""
+        self.__stored.update(self.__pending)
+        self.known_ids.add_all(self.__pending.keys())
+        self.__pending = {}
+
+    def rollback(self):
+        """The transaction was rolled back, its writes are forgotten."""
+        self.__pending = {}
@@ -10,6 +10,8 @@ from bs4 import BeautifulSoup
 
 
 class Playlist:
+    __slots__ = ('id', 'url', 'title', 'cover_image_url')
+
     def __init__(self, id: str, title: str, cover_image_url, url: str = None):
         self.id = id
         self.url = url if url else f"https://open.spotify.com/playlist/{self.id}"
@@ -190,22 +192,31 @@ class PlaylistDAO:
             cursor.close()
 
     def get_instance_from_scan(self, playlist_scan_id: str) -> Playlist | None:
+        """
+        Retrieves the Playlist of a scan in a single query, without loading anything else of the scan.
+        :param playlist_scan_id: The ID of the playlist_scan whose playlist to retrieve.
+        :return: A Playlist instance, or None if the scan is not found.
+        """
         try:
             cursor = self.connection.cursor(dictionary = True)
 
-            # Fetch artist data
             query = """
-            SELECT playlist_id
-            FROM playlist_scan
-            WHERE id = %s
+            SELECT p.id, p.title, p.cover_image_url
+            FROM playlist_scan ps
+            JOIN playlist p ON p.id = ps.playlist_id
+            WHERE ps.id = %s
             """
             cursor.execute(query, (playlist_scan_id,))
-            playlist_scan_data = cursor.fetchone()
+            playlist_data = cursor.fetchone()
 
-            if not playlist_scan_data:
+            if not playlist_data:
                 return None  # Scan not found
 
-            return self.get_instance(playlist_scan_data['playlist_id'])
+            return Playlist(
+                id = playlist_data["id"],
+                title = playlist_data["title"],
+                cover_image_url = playlist_data["cover_image_url"]
+            )
 
         except Exception as e:
             print(f"Error fetching user instance: {e}")
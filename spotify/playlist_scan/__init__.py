@@ -1,13 +1,16 @@
+import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import time, datetime
-from urllib import parse
+from os import environ
 
-import requests
 from bs4 import BeautifulSoup
 from mysql.connector.abstracts import MySQLConnectionAbstract
 from mysql.connector.pooling import PooledMySQLConnection
 from spotapi import PublicPlaylist
 
 from spotify import utilities
+from spotify.api.client import get_client
 
 from spotify.playlist import Playlist, PlaylistDAO
 from spotify.artist import Artist
@@ -18,11 +21,53 @@ from spotify import exceptions as exceptions
 
 from .interfaces import Update
 
+# Maximum amount of tracks Spotify returns per page
+PAGE_LIMIT = 100
+
+# Amount of playlist pages fetched at the same time
+PAGE_FETCH_WORKERS = int(environ.get("SPOTIFY_PAGE_FETCH_WORKERS", 8))
+
+# Fields of a playlist item needed to build a Track, and the fields needed to compare it with an earlier scan
+TRACK_FIELDS = "added_at,track(is_local,id,name,images,artists(name,id),album(id,name,release_date))"
+LISTING_FIELDS = "added_at,track(is_local,id,album(release_date))"
+
+# Maximum amount of delta scans stacked on top of a full scan, before a rescan stores the full playlist again
+MAX_DELTA_CHAIN = int(environ.get("MAX_DELTA_CHAIN", 20))
+
+# Maximum depth a scan chain is resolved to, guards the recursion against a cycle in the data
+MAX_SCAN_CHAIN_DEPTH = 1000
+
+# Resolves the chain of a scan (the scan itself at depth 0, then the scans a delta scan extends up to the first full
+# scan) as the table `chain`. Takes the scan id and the maximum depth as parameters.
+SCAN_CHAIN_CTE = """
+WITH RECURSIVE chain AS (
+    SELECT id, extends_playlist_scan, delta_scan, 0 AS depth
+    FROM playlist_scan
+    WHERE id = %s
+    UNION ALL
+    SELECT ps.id, ps.extends_playlist_scan, ps.delta_scan, chain.depth + 1
+    FROM playlist_scan ps
+    JOIN chain ON ps.id = chain.extends_playlist_scan
+    WHERE chain.delta_scan AND chain.depth < %s
+)
+"""
+
 
 class PlaylistScan:
     def __init__(self, playlist: Playlist, requested_by_user: User, export_completed: bool, created_at: datetime = None,
                  extends_playlist_scan: 'PlaylistScan' = None,
-                 id: str = None, tracks: list[Track] = None):
+                 id: str = None, tracks: list[Track] = None, snapshot_id: str = None, delta_scan: bool = False,
+                 extends_playlist_scan_id: str = None, load_extends_playlist_scan=None,
+                 inherited_tracks: list[Track] = None):
+        """
+        :param tracks: The tracks stored with this scan. For a delta scan only the tracks added since the scan it
+        extends, see get_all_tracks.
+        :param snapshot_id: The version of the playlist on Spotify when it was scanned.
+        :param delta_scan: Whether the scan only stores the tracks added since extends_playlist_scan.
+        :param extends_playlist_scan_id: The id of the scan it extends, when that scan is loaded lazily.
+        :param load_extends_playlist_scan: Loads the scan it extends on first access of extends_playlist_scan.
+        :param inherited_tracks: The tracks a delta scan inherits, when they are loaded up front.
+        """
 
         self.id = id
 
@@ -37,7 +82,10 @@ class PlaylistScan:
             raise RuntimeError("Cant initialise without a valid requested_by_user instance")
 
         self.export_completed = export_completed
-        self.extends_playlist_scan = extends_playlist_scan
+        self.__extends_playlist_scan = extends_playlist_scan
+        self.__extends_playlist_scan_id = extends_playlist_scan_id
+        self.__load_extends_playlist_scan = load_extends_playlist_scan
+        self.__inherited_tracks = inherited_tracks
 
         if tracks:
             self.tracks = tracks
@@ -45,131 +93,290 @@ class PlaylistScan:
             self.tracks = []
 
         self.created_at = created_at
+        self.snapshot_id = snapshot_id
+        self.delta_scan = delta_scan
+
+    @property
+    def extends_playlist_scan(self) -> 'PlaylistScan | None':
+        """The scan this scan extends, loaded on first access when it was not passed in."""
+        if self.__extends_playlist_scan is None and self.__load_extends_playlist_scan:
+            load, self.__load_extends_playlist_scan = self.__load_extends_playlist_scan, None
+            self.__extends_playlist_scan = load()
+        return self.__extends_playlist_scan
+
+    @extends_playlist_scan.setter
+    def extends_playlist_scan(self, extends_playlist_scan: 'PlaylistScan | None'):
+        self.__extends_playlist_scan = extends_playlist_scan
+        self.__extends_playlist_scan_id = None
+        self.__load_extends_playlist_scan = None
+
+    @property
+    def extends_playlist_scan_id(self) -> str | None:
+        """The id of the scan this scan extends, without loading it."""
+        if self.__extends_playlist_scan is not None:
+            return self.__extends_playlist_scan.id
+        return self.__extends_playlist_scan_id
+
+    @staticmethod
+    def __get_data(client, playlist_id: str, access_token: str, fields: str, offset: int = None,
+                   limit: int = None) -> dict:
+        """
+        Fetches the playlist info, or one offset/limit window of its tracks when an offset is given.
+        :param fields: The fields the Spotify API should return.
+        """
+        if offset is not None:
+            # Fetch one window of the playlist tracks
+            url = f"https://api.spotify.com/v1/playlists/{playlist_id}/tracks"
+            params = {"fields": fields, "offset": offset, "limit": limit}
+        else:
+            # Base URL for the Spotify Get Playlist endpoint
+            url = f"https://api.spotify.com/v1/playlists/{playlist_id}"
+            params = {"fields": fields}
+
+        # Make the API request
+        response = client.get(url, access_token = access_token, params = params)
+
+        if response.status_code != 200:
+            raise exceptions.SpotifyAPIError(f"Spotify API error: {response.status_code} - {response.text}",
+                                             response.status_code)
+
+        return response.json()
+
+    @staticmethod
+    def __get_pages(client, playlist_id: str, access_token: str, fields: str, offsets: range, limit: int,
+                    max_workers: int) -> list[list[dict]]:
+        """Fetches the track windows starting at the given offsets concurrently, in playlist order."""
+        if not offsets:
+            return []
+
+        with ThreadPoolExecutor(max_workers = max(1, min(max_workers, len(offsets)))) as executor:
+            # Executor.map yields the results in submission order, which keeps the playlist order intact
+            return list(executor.map(
+                lambda offset: PlaylistScan.__get_data(client, playlist_id, access_token, fields, offset, limit)['items'],
+                offsets
+            ))
+
+    @staticmethod
+    def __build_playlist(data: dict) -> Playlist:
+        return Playlist(
+            id = data['id'],
+            title = data['name'],
+            cover_image_url = data['images'][0]['url']  # TODO Check for better way to get the best image
+        )
 
     @classmethod
-    def build_from_api(cls, playlist_id: str, access_token: str, requested_by_user: User):
+    def build_from_api(cls, playlist_id: str, access_token: str, requested_by_user: User,
+                       max_workers: int = PAGE_FETCH_WORKERS):
+        """
+        Builds a PlaylistScan from the Spotify API.
 
-        def get_data(access_token, playlist_id, next=None):
+        The first request returns the playlist info, the first page of tracks and the total amount of tracks. From
+        that total every remaining offset/limit window is known up front, so the remaining pages are fetched
+        concurrently instead of walking the 'next' cursor one page at a time.
+        :param max_workers: The maximum amount of pages fetched at the same time (1 fetches them sequentially).
+        """
 
-            # Base URL for the Spotify Get Playlist endpoint
-            url = f"https://api.spotify.com/v1/playlists/{playlist_id}"
+        client = get_client()
 
-            headers = {
-                "Authorization": f"Bearer {access_token}"
-            }
+        # Specify fields to fetch only the required data
+        fields = (
+            # Playlist info
+            "id,name,images,snapshot_id,"
+            # Track info
+            f"tracks.items({TRACK_FIELDS}),"
+            # API logistics
+            "tracks.limit,tracks.total"
+        )
+        data = cls.__get_data(client, playlist_id, access_token, fields)
 
-            if next:
-                """
-                Handle spotify next to give faulty params which now have to be extracted, modified and resent...
-                """
+        # Work out the windows of all the remaining pages
+        tracks_data = data['tracks']
+        limit = tracks_data.get('limit') or PAGE_LIMIT
+        offsets = range(len(tracks_data['items']), tracks_data.get('total', 0), limit)
 
-                # Extract
-                params = parse.parse_qs(parse.urlparse(next).query)
-                url = next.split("?")[0]
+        pages = [tracks_data['items']]
+        pages += cls.__get_pages(client, playlist_id, access_token, f"items({TRACK_FIELDS})", offsets, limit,
+                                 max_workers)
 
-                offset = params['offset'][0]
-                limit = params['limit'][0]
+        tracks = []
+        for items in pages:
+            for item in items:
+                track = cls.__build_track(item)
+                if track:
+                    tracks.append(track)
 
-                params = {
-                    "fields": 'items(added_at,track(is_local,added_at,id,name,images,artists(name,id),album(id,name,release_date))),next',
-                    "offset": offset,
-                    "limit": limit
-                }
-            else:
-                # Specify fields to fetch only the required data
-                fields = (
-                    # Playlist info
-                    "id,name,images,"
-                    # Track info
-                    "tracks.items(added_at,track(is_local,id,name,images,artists(name,id),album(id,name,release_date))),"
-                    # API logistics
-                    "tracks.next"
-                )
-                params = {"fields": fields}
+        return cls(
+            playlist = cls.__build_playlist(data),
+            export_completed = False,
+            tracks = tracks,
+            requested_by_user = requested_by_user,
+            snapshot_id = data.get('snapshot_id')
+        )
 
-            # Make the API request
-            response = requests.get(url, headers = headers, params = params)
+    @classmethod
+    def build_delta_from_api(cls, playlist_id: str, access_token: str, requested_by_user: User,
+                             extends_playlist_scan: 'PlaylistScan', extended_track_ids: list[str],
+                             max_workers: int = PAGE_FETCH_WORKERS):
+        """
+        Builds a PlaylistScan that only holds the tracks added since an earlier scan of the playlist.
+
+        An unchanged snapshot_id means nothing changed, no tracks are fetched at all and the earlier scan itself is
+        returned, so no empty scan has to be stored. Otherwise a light listing
+        (ids and added_at only) of the playlist is compared with the earlier scan. When the earlier tracks are still
+        the start of the playlist and everything after them was added after the newest of them (the added_at
+        watermark), only the windows holding the new tracks are fetched in full. Any other change, like a removed
+        or moved track, falls back to a full scan.
+        :param extends_playlist_scan: The earlier scan, its tracks do not have to be loaded.
+        :param extended_track_ids: The ids of all the tracks of the earlier scan, in playlist order.
+        :return: A new (delta or full) scan, or extends_playlist_scan when the playlist did not change.
+        """
 
-            if response.status_code != 200:
-                raise Exception(f"Spotify API error: {response.status_code} - {response.text}")
+        client = get_client()
 
-            return response.json()
+        data = cls.__get_data(client, playlist_id, access_token, "id,name,images,snapshot_id,tracks.total")
+        playlist = cls.__build_playlist(data)
 
-        data = get_data(access_token, playlist_id)
+        def build_delta_scan(tracks: list[Track]) -> PlaylistScan:
+            return cls(
+                playlist = playlist,
+                export_completed = False,
+                tracks = tracks,
+                requested_by_user = requested_by_user,
+                extends_playlist_scan = extends_playlist_scan,
+                snapshot_id = data.get('snapshot_id'),
+                delta_scan = True
+            )
 
-        playlist = Playlist(
-            id = data['id'],
-            title = data['name'],
-            cover_image_url = data['images'][0]['url']  # TODO Check for better way to get the best image
-        )
+        if data.get('snapshot_id') and data['snapshot_id'] == extends_playlist_scan.snapshot_id:
+            return extends_playlist_scan
+
+        def build_full_scan() -> PlaylistScan:
+            return cls.build_from_api(playlist_id, access_token, requested_by_user, max_workers)
+
+        # List the usable items of the playlist, with their position among all the items
+        total = data['tracks'].get('total', 0)
+        listing = []
+        for page in cls.__get_pages(client, playlist_id, access_token, f"items({LISTING_FIELDS})",
+                                    range(0, total, PAGE_LIMIT), PAGE_LIMIT, max_workers):
+            for item in page:
+                if cls.__is_usable(item):
+                    listing.append((len(listing), item))
+                else:
+                    listing.append((len(listing), None))
+
+        usable = [(position, item) for position, item in listing if item is not None]
+        amount_extended = len(extended_track_ids)
+
+        # The earlier tracks have to be the start of the playlist, unchanged
+        if [item['track']['id'] for _, item in usable[:amount_extended]] != extended_track_ids:
+            return build_full_scan()
+
+        added = usable[amount_extended:]
+        if not added:
+            return build_delta_scan([])
+
+        # Everything after them has to be added later than the newest of them
+        watermark = max((cls.__parse_added_at(item) for _, item in usable[:amount_extended]), default = None)
+        if watermark and any(cls.__parse_added_at(item) < watermark for _, item in added):
+            return build_full_scan()
+
+        # Fetch the windows holding the added tracks in full
+        first_position = added[0][0]
+        pages = cls.__get_pages(client, playlist_id, access_token, f"items({TRACK_FIELDS})",
+                                range(first_position, total, PAGE_LIMIT), PAGE_LIMIT, max_workers)
 
         tracks = []
-        tracks_data = data['tracks']
-        if tracks_data['next']:
-            next_url = tracks_data['next']
-        else:
-            next_url = True  # So while loop runs once if there is no need for a second page
-        while next_url:
-
-            for item in tracks_data['items']:
-
-                # Skip local files
-                if item.get("track", {}).get("is_local", False):  # Safely check for 'is_local'
-                    continue
-
-                # Check if 'album' exists and is not None
-                if not item["track"].get("album"):
-                    continue
-
-                # Check if 'release_date' exists and is not None
-                if not item["track"]["album"].get("release_date"):
-                    continue
-
-                # Convert the artist data into instances
-                artists = []
-                for artist in item['track']['artists']:
-                    if not artist.get("name"):
-                        continue
-                    artists.append(Artist(
-                        artist_id = artist['id'],
-                        name = artist['name']
-                    ))
-
-                # Convert the album data into an instance
-                album = Album(
-                    album_id = item['track']['album']['id'],
-                    title = item['track']['album']['name'],
-                    release_year = int(item['track']['album']['release_date'][:4])
-                )
-
-                # Convert all the data into one track instance
-                tracks.append(Track(
-                    track_id = item['track']['id'],
-                    title = item['track']['name'],
-                    album = album,
-                    artists = artists,
-                    added_at = datetime.strptime(item['added_at'], "%Y-%m-%dT%H:%M:%SZ")
-                ))
-            next_url = tracks_data['next']
-            if next_url:
-                tracks_data = get_data(access_token, playlist_id, next = next_url)
+        for items in pages:
+            for item in items:
+                track = cls.__build_track(item)
+                if track:
+                    tracks.append(track)
 
-        return cls(
-            playlist = playlist,
-            export_completed = False,
-            tracks = tracks,
-            requested_by_user = requested_by_user
+        # The playlist changed in between the requests
+        if [track.id for track in tracks] != [item['track']['id'] for _, item in added]:
+            return build_full_scan()
+
+        return build_delta_scan(tracks)
+
+    @staticmethod
+    def __is_usable(item: dict) -> bool:
+        """Whether a playlist item can be turned into a Track, local files and tracks without album can not."""
+        track = item.get("track") or {}
+        if track.get("is_local", False) or not track.get("id"):
+            return False
+
+        return bool((track.get("album") or {}).get("release_date"))
+
+    @staticmethod
+    def __parse_added_at(item: dict) -> datetime:
+        return datetime.strptime(item['added_at'], "%Y-%m-%dT%H:%M:%SZ")
+
+    @staticmethod
+    def __build_track(item: dict) -> Track | None:
+        """
+        Converts a playlist item of the Spotify API into a Track instance.
+        :return: A Track instance, or None if the item can not be used (e.g. local files).
+        """
+
+        # Skip local files and tracks without album or release date
+        if not PlaylistScan.__is_usable(item):
+            return None
+
+        # Convert the artist data into instances
+        artists = []
+        for artist in item['track']['artists']:
+            if not artist.get("name"):
+                continue
+            artists.append(Artist.intern(
+                artist_id = artist['id'],
+                name = artist['name']
+            ))
+
+        # Convert the album data into an instance
+        album = Album.intern(
+            album_id = item['track']['album']['id'],
+            title = item['track']['album']['name'],
+            release_year = int(item['track']['album']['release_date'][:4])
+        )
+
+        # Convert all the data into one track instance
+        return Track(
+            track_id = item['track']['id'],
+            title = item['track']['name'],
+            album = album,
+            artists = artists,
+            added_at = datetime.strptime(item['added_at'], "%Y-%m-%dT%H:%M:%SZ")
         )
 
     def get_inherited_tracks(self) -> list[Track]:
-        tracks = []
+        """The tracks a delta scan inherits from the scans it extends, in playlist order."""
+        if not self.delta_scan:
+            return []
 
-        if self.extends_playlist_scan:
-            for track in self.extends_playlist_scan.get_inherited_tracks():
-                tracks.append(track)
+        if self.__inherited_tracks is not None:
+            return self.__inherited_tracks
 
-        return tracks
+        if not self.extends_playlist_scan:
+            return []
 
+        return self.extends_playlist_scan.get_all_tracks()
+
+    def get_all_tracks(self, only_unique: bool = False) -> list[Track]:
+        """
+        All the tracks of the playlist at the time of the scan, the inherited tracks followed by its own.
+        :param only_unique: Only keep the first occurrence of every track.
+        """
+        tracks = self.get_inherited_tracks() + self.tracks
+        if not only_unique:
+            return tracks
+
+        seen = set()
+        unique_tracks = []
+        for track in tracks:
+            if track.id not in seen:
+                seen.add(track.id)
+                unique_tracks.append(track)
+        return unique_tracks
 
 
 class PlaylistScanDAO:
@@ -190,8 +397,11 @@ class PlaylistScanDAO:
     def put_instance(self, playlist_scan: PlaylistScan) -> str | None:
         """
         Inserts or updates the data of a scan capturing playlist in the database.
+        A new scan gets a random UUID as id before it is inserted, so no query is needed to find its id afterward.
         :param playlist_scan: A PlaylistScan object containing the playlist scan data.
+        :return: The id of the scan, or None if it could not be stored.
         """
+        generated_id = False
         try:
             cursor = self.connection.cursor(dictionary = True)
 
@@ -208,107 +418,301 @@ class PlaylistScanDAO:
             else:
                 existing_playlist_scan = None
 
-            to_return = None
-
             if existing_playlist_scan:
 
                 # Update the existing playlist
                 update_query = ("UPDATE playlist_scan SET extends_playlist_scan = %s, playlist_id = %s, "
-                                "requested_by_user_id = %s, export_completed = %s WHERE id = %s")
+                                "requested_by_user_id = %s, export_completed = %s, snapshot_id = %s, delta_scan = %s "
+                                "WHERE id = %s")
                 cursor.execute(update_query, (
-                    playlist_scan.extends_playlist_scan.id if playlist_scan.extends_playlist_scan else None,
+                    playlist_scan.extends_playlist_scan_id,
                     playlist_scan.playlist.id,
                     playlist_scan.requested_by_user.id, int(playlist_scan.export_completed),
+                    playlist_scan.snapshot_id, int(playlist_scan.delta_scan),
                     playlist_scan.id))
 
-                # Fetch current tracks
-                cursor.execute("""
-                    SELECT track_id 
-                    FROM playlist_scan_track 
-                    WHERE playlist_scan_id = %s
-                """, (playlist_scan.id,))
-                existing_tracks = set(row["track_id"] for row in cursor.fetchall())
-
-                # Identify removed tracks
-                new_tracks = set(track.id for track in playlist_scan.tracks)
-                tracks_to_remove = existing_tracks - new_tracks
-
-                # Remove obsolete tracks
-                if tracks_to_remove:
-                    cursor.executemany("""
-                        DELETE FROM playlist_scan_track 
-                        WHERE playlist_scan_id = %s AND track_id = %s
-                    """, [(playlist_scan.id, track_id) for track_id in tracks_to_remove])
-
-                # Insert new tracks
-                for index, track in enumerate(playlist_scan.tracks):
-                    if track.id not in existing_tracks:
-                        self.track_dao.put_instance(track)
-                        cursor.execute("""
-                            INSERT INTO playlist_scan_track (playlist_scan_id, track_playlist_scan_index, track_id, track_added_at)
-                            VALUES (%s, %s, %s, %s)
-                        """, (playlist_scan.id, index, track.id, track.added_at))
+                # Reconcile the stored tracks with the scanned ones
+                self.__update_scan_tracks(cursor, playlist_scan)
 
             else:
+                # Generate the id of the new scan
+                if not playlist_scan.id:
+                    playlist_scan.id = str(uuid.uuid4())
+                    generated_id = True
+
                 # Insert the new playlist
                 insert_query = (
-                    "INSERT INTO playlist_scan (playlist_id, requested_by_user_id, export_completed, extends_playlist_scan) "
-                    "VALUES (%s, %s, %s, %s)")
+                    "INSERT INTO playlist_scan (id, playlist_id, requested_by_user_id, export_completed, "
+                    "extends_playlist_scan, snapshot_id, delta_scan) "
+                    "VALUES (%s, %s, %s, %s, %s, %s, %s)")
                 cursor.execute(insert_query, (
+                    playlist_scan.id,
                     playlist_scan.playlist.id, playlist_scan.requested_by_user.id, int(playlist_scan.export_completed),
-                    playlist_scan.extends_playlist_scan.id if playlist_scan.extends_playlist_scan else None)
+                    playlist_scan.extends_playlist_scan_id,
+                    playlist_scan.snapshot_id, int(playlist_scan.delta_scan))
                     )
 
-                # Get the just created instance id
-                playlist_scan.id = self.get_latest_id()
-
-                # Ensure all the tracks exist, using TrackDAO
-                if playlist_scan.tracks:
+                # Ensure all the tracks exist and link them to the scan
+                self.__put_scan_tracks(cursor, playlist_scan, list(enumerate(playlist_scan.tracks)))
 
-                    # only get unique tracks
-                    for index, track in enumerate(playlist_scan.tracks):
-                        self.track_dao.put_instance(track)
+            # Precompute the track counts of the scan, within the same transaction
+            self.__put_statistics(cursor, playlist_scan.id)
 
-                        # Link the tracks to the scan
-                        relationship_query = """
-                        INSERT INTO playlist_scan_track (playlist_scan_id, track_playlist_scan_index, track_id, track_added_at)
-                        VALUES (%s, %s, %s, %s)
-                        """
-                        cursor.execute(relationship_query, (playlist_scan.id, index, track.id, track.added_at))
+            # The counts of the delta scans extending an updated scan include its tracks
+            if existing_playlist_scan:
+                for descendant_id in self.__get_descendant_ids(cursor, playlist_scan.id):
+                    self.__put_statistics(cursor, descendant_id)
 
-            # Commit the transaction
+            # Commit the transaction, only then the written artists, albums and tracks count as stored
             self.connection.commit()
+            self.track_dao.identity_map.commit()
 
-            # Return the ID if the playlist_scan ID was just generated
-            if not playlist_scan.id:
-                to_return = self.get_latest_id()
-
-            return to_return
+            return playlist_scan.id
 
         except Exception as e:
             print(f"Error: {e}")
             self.connection.rollback()
+            self.track_dao.identity_map.rollback()
+
+            # The scan was not stored under the generated id
+            if generated_id:
+                playlist_scan.id = None
+            return None
         finally:
             cursor.close()
 
-    def get_latest_id(self) -> str | None:
+    def __put_scan_tracks(self, cursor, playlist_scan: PlaylistScan, indexed_tracks: list[tuple[int, Track]]):
+        """
+        Stores tracks and links them to a scan in batches, within the transaction of the given cursor.
+        :param indexed_tracks: (track_playlist_scan_index, Track) pairs to link to the scan.
+        """
+        if not indexed_tracks:
+            return
+
+        # Ensure all the tracks exist, using TrackDAO
+        self.track_dao.put_instances([track for _, track in indexed_tracks])
+
+        # Link the tracks to the scan
+        relationship_query = """
+        INSERT INTO playlist_scan_track (playlist_scan_id, track_playlist_scan_index, track_id, track_added_at)
+        VALUES (%s, %s, %s, %s)
+        """
+        for batch in utilities.chunked(indexed_tracks):
+            cursor.executemany(relationship_query, [
+                (playlist_scan.id, index, track.id, track.added_at) for index, track in batch
+            ])
+
+    def __update_scan_tracks(self, cursor, playlist_scan: PlaylistScan):
+        """
+        Makes the stored tracks of an existing scan match its tracks, within the transaction of the given cursor.
+        The tracks are staged in a temporary table and reconciled with a few set-based statements, so the amount of
+        round trips does not grow with the amount of stored tracks. A row is identified by its index and track, so
+        reordered tracks are moved and a track in the playlist more than once keeps a row per position.
+        """
+        # Ensure all the tracks exist, using TrackDAO
+        self.track_dao.put_instances(playlist_scan.tracks)
+
+        # Temporary tables are private to the connection and do not end the transaction
+        cursor.execute("DROP TEMPORARY TABLE IF EXISTS playlist_scan_track_staging")
+        cursor.execute("""
+            CREATE TEMPORARY TABLE playlist_scan_track_staging (
+                track_playlist_scan_index INT NOT NULL PRIMARY KEY,
+                track_id VARCHAR(255) NOT NULL,
+                track_added_at TIMESTAMP NOT NULL
+            )
+        """)
+
+        try:
+            staging_query = """
+            INSERT INTO playlist_scan_track_staging (track_playlist_scan_index, track_id, track_added_at)
+            VALUES (%s, %s, %s)
+            """
+            for batch in utilities.chunked(list(enumerate(playlist_scan.tracks))):
+                cursor.executemany(staging_query, [(index, track.id, track.added_at) for index, track in batch])
+
+            # Remove the rows whose position now holds another track, or no track at all
+            cursor.execute("""
+                DELETE pst
+                FROM playlist_scan_track pst
+                LEFT JOIN playlist_scan_track_staging s ON s.track_playlist_scan_index = pst.track_playlist_scan_index
+                    AND s.track_id = pst.track_id
+                WHERE pst.playlist_scan_id = %s AND s.track_id IS NULL
+            """, (playlist_scan.id,))
+
+            # Add the new rows, and update when a track was added at another moment
+            cursor.execute("""
+                INSERT INTO playlist_scan_track (playlist_scan_id, track_playlist_scan_index, track_id, track_added_at)
+                SELECT %s, s.track_playlist_scan_index, s.track_id, s.track_added_at
+                FROM playlist_scan_track_staging s
+                ON DUPLICATE KEY UPDATE track_added_at = s.track_added_at
+            """, (playlist_scan.id,))
+        finally:
+            cursor.execute("DROP TEMPORARY TABLE IF EXISTS playlist_scan_track_staging")
+
+    @staticmethod
+    def __get_descendant_ids(cursor, playlist_scan_id: str) -> list[str]:
+        """The ids of the delta scans that inherit the tracks of a scan, directly or through other delta scans."""
+        cursor.execute("""
+            WITH RECURSIVE descendants AS (
+                SELECT id, 1 AS depth
+                FROM playlist_scan
+                WHERE extends_playlist_scan = %s AND delta_scan
+                UNION ALL
+                SELECT ps.id, descendants.depth + 1
+                FROM playlist_scan ps
+                JOIN descendants ON ps.extends_playlist_scan = descendants.id
+                WHERE ps.delta_scan AND descendants.depth < %s
+            )
+            SELECT id FROM descendants ORDER BY depth
+        """, (playlist_scan_id, MAX_SCAN_CHAIN_DEPTH))
+        return [row["id"] for row in cursor.fetchall()]
+
+    def __put_statistics(self, cursor, playlist_scan_id: str):
+        """
+        Stores the track counts of a scan, including the tracks a delta scan inherits, within the transaction of the
+        given cursor. Next to the totals the counts are bucketed by track_added_at, so the counts of the tracks added
+        after any moment are a sum over the buckets after it:
+        - amount_of_tracks counts the rows added at that moment
+        - amount_of_unique_tracks counts the tracks whose last addition was at that moment
+        """
+        chain_params = (playlist_scan_id, MAX_SCAN_CHAIN_DEPTH)
+
+        cursor.execute(f"""
+            {SCAN_CHAIN_CTE}
+            SELECT track_added_at, COUNT(*) AS amount
+            FROM playlist_scan_track
+            WHERE playlist_scan_id IN (SELECT id FROM chain)
+            GROUP BY track_added_at
+        """, chain_params)
+        buckets = {row["track_added_at"]: [row["amount"], 0] for row in cursor.fetchall()}
+
+        cursor.execute(f"""
+            {SCAN_CHAIN_CTE}
+            SELECT last_added_at, COUNT(*) AS amount
+            FROM (
+                SELECT track_id, MAX(track_added_at) AS last_added_at
+                FROM playlist_scan_track
+                WHERE playlist_scan_id IN (SELECT id FROM chain)
+                GROUP BY track_id
+            ) AS last_additions
+            GROUP BY last_added_at
+        """, chain_params)
+        for row in cursor.fetchall():
+            buckets[row["last_added_at"]][1] = row["amount"]
+
+        cursor.execute("""
+            INSERT INTO playlist_scan_statistics (playlist_scan_id, amount_of_tracks, amount_of_unique_tracks)
+            VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE amount_of_tracks = VALUES(amount_of_tracks),
+                                    amount_of_unique_tracks = VALUES(amount_of_unique_tracks)
+        """, (playlist_scan_id, sum(amount for amount, _ in buckets.values()),
+              sum(amount for _, amount in buckets.values())))
+
+        cursor.execute("DELETE FROM playlist_scan_statistics_bucket WHERE playlist_scan_id = %s", (playlist_scan_id,))
+        bucket_query = """
+        INSERT INTO playlist_scan_statistics_bucket (playlist_scan_id, track_added_at, amount_of_tracks,
+                                                     amount_of_unique_tracks)
+        VALUES (%s, %s, %s, %s)
+        """
+        for batch in utilities.chunked(list(buckets.items())):
+            cursor.executemany(bucket_query, [
+                (playlist_scan_id, added_at, amount, amount_unique) for added_at, (amount, amount_unique) in batch
+            ])
+
+    def get_statistics(self, playlist_scan_id: str, newer_than_playlist_scan_id: str = None) -> dict | None:
+        """
+        Retrieves the precomputed track counts of a scan, computing them first for scans stored before there were
+        statistics.
+        :param newer_than_playlist_scan_id: Only count the tracks added after this scan was made.
+        :return: A dict with amount_of_tracks and amount_of_unique_tracks, or None if the scan is not found.
+        """
+        for attempt in range(2):
+            try:
+                cursor = self.connection.cursor(dictionary = True)
+
+                if newer_than_playlist_scan_id:
+                    query = """
+                    SELECT COALESCE(SUM(b.amount_of_tracks), 0) AS amount_of_tracks,
+                           COALESCE(SUM(b.amount_of_unique_tracks), 0) AS amount_of_unique_tracks
+                    FROM playlist_scan_statistics s
+                    LEFT JOIN playlist_scan_statistics_bucket b ON b.playlist_scan_id = s.playlist_scan_id
+                        AND b.track_added_at > (SELECT timestamp FROM playlist_scan WHERE id = %s)
+                    WHERE s.playlist_scan_id = %s
+                    GROUP BY s.playlist_scan_id
+                    """
+                    cursor.execute(query, (newer_than_playlist_scan_id, playlist_scan_id))
+                else:
+                    query = """
+                    SELECT amount_of_tracks, amount_of_unique_tracks
+                    FROM playlist_scan_statistics
+                    WHERE playlist_scan_id = %s
+                    """
+                    cursor.execute(query, (playlist_scan_id,))
+                statistics = cursor.fetchone()
+
+                if statistics:
+                    return {key: int(value) for key, value in statistics.items()}
+
+                if attempt:
+                    return None
+
+                # Backfill the statistics of a scan stored before there were statistics
+                cursor.execute("SELECT id FROM playlist_scan WHERE id = %s", (playlist_scan_id,))
+                if not cursor.fetchone():
+                    return None  # Scan not found
+
+                self.__put_statistics(cursor, playlist_scan_id)
+                self.connection.commit()
+
+            except Exception as e:
+                print(f"Error fetching playlist_scan statistics: {e}")
+                self.connection.rollback()
+                return None
+            finally:
+                cursor.close()
+
+    def update_export_completed(self, playlist_scan_id: str, export_completed: bool):
+        """Only updates the export state of a scan, leaving its tracks and the scan it extends untouched."""
         try:
             cursor = self.connection.cursor(dictionary = True)
+            cursor.execute("UPDATE playlist_scan SET export_completed = %s WHERE id = %s",
+                           (int(export_completed), playlist_scan_id))
+            self.connection.commit()
+        except Exception as e:
+            print(f"Error updating playlist_scan export state: {e}")
+            self.connection.rollback()
+        finally:
+            cursor.close()
 
-            # Fetch artist data
+    def get_latest_instance(self, playlist_id: str) -> PlaylistScan | None:
+        """
+        Retrieves the most recent scan of a playlist, without loading its tracks or the scan it extends.
+        :return: A PlaylistScan instance, or None if the playlist was never scanned.
+        """
+        try:
+            cursor = self.connection.cursor(dictionary = True)
             query = """
-            SELECT id
-            FROM playlist_scan 
-            ORDER BY timestamp DESC 
-            LIMIT 1;
+            SELECT id, playlist_id, requested_by_user_id, export_completed, timestamp, snapshot_id, delta_scan
+            FROM playlist_scan
+            WHERE playlist_id = %s
+            ORDER BY timestamp DESC
+            LIMIT 1
             """
-            cursor.execute(query)
-            playlist_scan_id = cursor.fetchone()
+            cursor.execute(query, (playlist_id,))
+            playlist_scan_data = cursor.fetchone()
 
-            if not playlist_scan_id:
-                return None  # No scan created yet
+            if not playlist_scan_data:
+                return None  # Playlist never scanned
 
-            return playlist_scan_id['id']
+            return PlaylistScan(
+                id = playlist_scan_data["id"],
+                playlist = self.playlist_dao.get_instance(playlist_scan_data["playlist_id"]),
+                requested_by_user = self.user_dao.get_instance(playlist_scan_data["requested_by_user_id"]),
+                export_completed = bool(playlist_scan_data["export_completed"]),
+                created_at = playlist_scan_data["timestamp"],
+                snapshot_id = playlist_scan_data["snapshot_id"],
+                delta_scan = bool(playlist_scan_data["delta_scan"])
+            )
 
         except Exception as e:
             print(f"Error fetching playlist_scan instance: {e}")
@@ -316,6 +720,59 @@ class PlaylistScanDAO:
         finally:
             cursor.close()
 
+    def get_scan_chain(self, playlist_scan_id: str) -> list[str]:
+        """
+        The ids of the scans whose tracks make up the playlist of a scan, the scan itself first.
+        A delta scan is followed by the scan it extends, up to the first full scan.
+        """
+        try:
+            cursor = self.connection.cursor(dictionary = True)
+            cursor.execute(f"{SCAN_CHAIN_CTE} SELECT id FROM chain ORDER BY depth",
+                           (playlist_scan_id, MAX_SCAN_CHAIN_DEPTH))
+            return [row["id"] for row in cursor.fetchall()]
+
+        except Exception as e:
+            print(f"Error fetching playlist_scan chain: {e}")
+            return []
+        finally:
+            cursor.close()
+
+    def get_chain_tracks(self, playlist_scan_id: str, newer_than: datetime = None) -> list[dict]:
+        """
+        The track rows of all the scans in the chain of a scan, in playlist order, resolved in a single query.
+        :param newer_than: Only include the tracks added after this moment.
+        :return: Dicts with the playlist_scan_id storing the track and its track_id.
+        """
+        try:
+            cursor = self.connection.cursor(dictionary = True)
+
+            # The oldest scan of the chain holds the start of the playlist
+            query = f"""
+            {SCAN_CHAIN_CTE}
+            SELECT pst.playlist_scan_id, pst.track_id
+            FROM chain
+            JOIN playlist_scan_track pst ON pst.playlist_scan_id = chain.id
+            {"WHERE pst.track_added_at > %s" if newer_than else ""}
+            ORDER BY chain.depth DESC, pst.track_playlist_scan_index
+            """
+
+            params = [playlist_scan_id, MAX_SCAN_CHAIN_DEPTH]
+            if newer_than:
+                params.append(newer_than)
+
+            cursor.execute(query, tuple(params))
+            return cursor.fetchall()
+
+        except Exception as e:
+            print(f"Error fetching playlist_scan tracks: {e}")
+            return []
+        finally:
+            cursor.close()
+
+    def get_track_ids(self, playlist_scan_id: str) -> list[str]:
+        """The ids of all the tracks of a scan, including the tracks a delta scan inherits, in playlist order."""
+        return [row["track_id"] for row in self.get_chain_tracks(playlist_scan_id)]
+
     def get_attributes(self, playlist_scan_id: str, attributes: tuple) -> dict | None:
         try:
             cursor = self.connection.cursor(dictionary = True)
@@ -367,18 +824,82 @@ class PlaylistScanDAO:
         finally:
             cursor.close()
 
+    def get_details(self, playlist_scan_id: str, newer_than_playlist_scan_id: str = None) -> dict | None:
+        """
+        Retrieves what the export page shows of a scan in a single lookup: the playlist, the export state, the scans of
+        the playlist that can be extended from and the precomputed track counts.
+        :param newer_than_playlist_scan_id: Only count the tracks added after this scan was made.
+        :return: A dict with title, playlist_id, cover_image_url, export_completed, extend_options, amount_of_tracks and
+        amount_of_unique_tracks, or None if the scan is not found.
+        """
+        try:
+            cursor = self.connection.cursor(dictionary = True)
+
+            if newer_than_playlist_scan_id:
+                amounts = """
+                IF(s.playlist_scan_id IS NULL, NULL, COALESCE(SUM(b.amount_of_tracks), 0)) AS amount_of_tracks,
+                IF(s.playlist_scan_id IS NULL, NULL, COALESCE(SUM(b.amount_of_unique_tracks), 0)) AS amount_of_unique_tracks
+                """
+                buckets = """
+                LEFT JOIN playlist_scan_statistics_bucket b ON b.playlist_scan_id = s.playlist_scan_id
+                    AND b.track_added_at > (SELECT timestamp FROM playlist_scan WHERE id = %s)
+                """
+                params = (newer_than_playlist_scan_id, playlist_scan_id)
+            else:
+                amounts = "s.amount_of_tracks, s.amount_of_unique_tracks"
+                buckets = ""
+                params = (playlist_scan_id,)
+
+            query = f"""
+            SELECT p.title, p.id AS playlist_id, p.cover_image_url, ps.export_completed,
+                   (SELECT JSON_ARRAYAGG(JSON_OBJECT('id', other.id))
+                    FROM playlist_scan other
+                    WHERE other.playlist_id = ps.playlist_id AND other.export_completed) AS extend_options,
+                   {amounts}
+            FROM playlist_scan ps
+            JOIN playlist p ON p.id = ps.playlist_id
+            LEFT JOIN playlist_scan_statistics s ON s.playlist_scan_id = ps.id
+            {buckets}
+            WHERE ps.id = %s
+            GROUP BY ps.id
+            """
+            cursor.execute(query, params)
+            details = cursor.fetchone()
+
+            if not details:
+                return None  # Scan not found
+
+            details['extend_options'] = json.loads(details['extend_options']) if details['extend_options'] else None
+
+        except Exception as e:
+            print(f"Error fetching playlist_scan details: {e}")
+            return None
+        finally:
+            cursor.close()
+
+        if details['amount_of_tracks'] is None:
+            # Only scans stored before there were statistics lack them, get_statistics backfills them
+            statistics = self.get_statistics(playlist_scan_id, newer_than_playlist_scan_id) or {}
+            details['amount_of_tracks'] = statistics.get('amount_of_tracks', 0)
+            details['amount_of_unique_tracks'] = statistics.get('amount_of_unique_tracks', 0)
+
+        details['amount_of_tracks'] = int(details['amount_of_tracks'])
+        details['amount_of_unique_tracks'] = int(details['amount_of_unique_tracks'])
+        return details
+
     def get_track_attributes(self, playlist_scan_id: str, attributes: tuple, newer_than: datetime = None) -> dict | None:
         try:
             cursor = self.connection.cursor(dictionary = True)
-            # Fetch artist data
+            # A delta scan includes the tracks of the scans it extends
             query = f"""
+            {SCAN_CHAIN_CTE}
             SELECT {", ".join(attributes)}
             FROM playlist_scan_track
-            WHERE playlist_scan_id = %s
+            WHERE playlist_scan_id IN (SELECT id FROM chain)
             {f"AND track_added_at > %s" if newer_than else ""}
             """
 
-            params = [playlist_scan_id]
+            params = [playlist_scan_id, MAX_SCAN_CHAIN_DEPTH]
             if newer_than:
                 params.append(newer_than)
 
@@ -400,6 +921,9 @@ class PlaylistScanDAO:
     def get_instance(self, playlist_scan_id: str, tracks_only_unique: bool = False, tracks_newer_than: datetime = None) -> PlaylistScan | None:
         """
         Retrieves an Artist instance by its ID from the database.
+        The tracks of a delta scan are only the tracks it stores itself, get_all_tracks includes the inherited ones.
+        The inherited tracks are resolved in the same query as its own, the scans it extends are only loaded when
+        extends_playlist_scan is accessed.
         :param tracks_newer_than: The date the tracks to be initialized must be newer of
         :param tracks_only_unique:
         :param playlist_scan_id: The ID of the playlist_scan to retrieve.
@@ -410,7 +934,8 @@ class PlaylistScanDAO:
 
             # Fetch artist data
             query = """
-            SELECT id, playlist_id, extends_playlist_scan, requested_by_user_id, export_completed, timestamp
+            SELECT id, playlist_id, extends_playlist_scan, requested_by_user_id, export_completed, timestamp,
+                   snapshot_id, delta_scan
             FROM playlist_scan
             WHERE id = %s
             """
@@ -420,27 +945,31 @@ class PlaylistScanDAO:
             if not playlist_scan_data:
                 return None  # Track not found
 
-            # Fetch associated tracks
-            query = f"""
-            SELECT {'DISTINCT t.id' if tracks_only_unique else 't.id'}
-            FROM track t
-            INNER JOIN playlist_scan_track pst ON t.id = pst.track_id
-            WHERE pst.playlist_scan_id = %s
-            {f"AND pst.track_added_at > %s" if tracks_newer_than else ""}
-            ORDER BY pst.track_playlist_scan_index
-            """
+            # Fetch the tracks of the scan and the tracks it inherits at once, the inherited ones apply the same filters
+            delta_scan = bool(playlist_scan_data["delta_scan"])
+            chain_tracks = self.get_chain_tracks(playlist_scan_id, tracks_newer_than) if delta_scan else \
+                self.__get_own_tracks(cursor, playlist_scan_id, tracks_newer_than)
 
-            params = [playlist_scan_id]
-            if tracks_newer_than:
-                params.append(tracks_newer_than)
+            # Construct the tracks in bulk, keeping the scan order
+            tracks_by_id = self.track_dao.get_instances(list({row["track_id"]: None for row in chain_tracks}))
+            track_instances = []
+            inherited_tracks = []
+            for row in chain_tracks:
+                if row["track_id"] in tracks_by_id:
+                    own_track = row["playlist_scan_id"] == playlist_scan_data["id"]
+                    (track_instances if own_track else inherited_tracks).append(tracks_by_id[row["track_id"]])
 
-            cursor.execute(query, tuple(params))
-            tracks = cursor.fetchall()
+            if tracks_only_unique:
+                track_instances = self.__unique(track_instances)
+                inherited_tracks = self.__unique(inherited_tracks)
+
+            # The scan it extends is only loaded when it is accessed
+            extends_playlist_scan_id = playlist_scan_data["extends_playlist_scan"]
 
-            # Construct artists
-            track_instances = [
-                self.track_dao.get_instance(track_id = track["id"]) for track in tracks
-            ]
+            def load_extends_playlist_scan() -> PlaylistScan | None:
+                if delta_scan:
+                    return self.get_instance(extends_playlist_scan_id, tracks_only_unique, tracks_newer_than)
+                return self.get_instance(extends_playlist_scan_id, False)
 
             # Construct and return the Track instance
             return PlaylistScan(
@@ -449,9 +978,12 @@ class PlaylistScanDAO:
                 requested_by_user = self.user_dao.get_instance(playlist_scan_data["requested_by_user_id"]),
                 export_completed = bool(playlist_scan_data["export_completed"]),
                 tracks = track_instances,
-                extends_playlist_scan = self.get_instance(playlist_scan_data[
-                                                              "extends_playlist_scan"], False) if "extends_playlist_scan" in playlist_scan_data else None,
-                created_at = playlist_scan_data["timestamp"]
+                created_at = playlist_scan_data["timestamp"],
+                snapshot_id = playlist_scan_data["snapshot_id"],
+                delta_scan = delta_scan,
+                extends_playlist_scan_id = extends_playlist_scan_id,
+                load_extends_playlist_scan = load_extends_playlist_scan if extends_playlist_scan_id else None,
+                inherited_tracks = inherited_tracks if delta_scan else None
             )
 
         except Exception as e:
@@ -459,3 +991,26 @@ class PlaylistScanDAO:
             return None
         finally:
             cursor.close()
+
+    @staticmethod
+    def __get_own_tracks(cursor, playlist_scan_id: str, newer_than: datetime = None) -> list[dict]:
+        """The track rows a scan stores itself, in playlist order, shaped like the rows of get_chain_tracks."""
+        query = f"""
+        SELECT playlist_scan_id, track_id
+        FROM playlist_scan_track
+        WHERE playlist_scan_id = %s
+        {"AND track_added_at > %s" if newer_than else ""}
+        ORDER BY track_playlist_scan_index
+        """
+
+        params = [playlist_scan_id]
+        if newer_than:
+            params.append(newer_than)
+
+        cursor.execute(query, tuple(params))
+        return cursor.fetchall()
+
+    @staticmethod
+    def __unique(tracks: list[Track]) -> list[Track]:
+        """Keeps the first occurrence of every track."""
+        return list({track.id: track for track in tracks}.values())
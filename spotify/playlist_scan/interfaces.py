@@ -27,7 +27,10 @@ class UpdateWeb(Update):
         self.redis_client = redis_client
 
         self.start_time = time()
-        self.runtimes = []
+
+        # Exponentially weighted moving average of the time per iteration
+        self.avg_time = None
+        self.smoothing = 0.3
 
     def get_analytics(self, iteration: int, total_iterations: int, current_track: Track):
 
@@ -39,14 +42,14 @@ class UpdateWeb(Update):
         self.meta['progress_info']['iteration'] = iteration
 
         # Time left
-        self.runtimes.append(time() - self.start_time)
-        avg_time = sum(self.runtimes) / len(self.runtimes)
-        time_left = round(avg_time * (total_iterations - iteration))
+        runtime = time() - self.start_time
+        self.avg_time = runtime if self.avg_time is None else self.avg_time + self.smoothing * (runtime - self.avg_time)
+        time_left = round(self.avg_time * (total_iterations - iteration))
         self.meta['progress_info']['time_left_estimate'] = str(timedelta(seconds = time_left))
 
         # Track info
         self.meta['progress_info']['track_name'] = current_track.title
-        self.meta['progress_info']['track_artist'] = current_track.album.get_artist_name()
+        self.meta['progress_info']['track_artist'] = current_track.get_artist_name()
 
         # For next iter
         self.start_time = time()
@@ -6,24 +6,36 @@ from mysql.connector.pooling import PooledMySQLConnection
 import spotify.utilities as utilities
 from spotify.album import Album, AlbumDAO
 from spotify.artist import Artist, ArtistDAO
+from spotify.identity import IdentityMap
 from typing_extensions import Self
 
 
 class Track:
+    __slots__ = ('id', 'title', 'album', 'artists', 'added_at', '__url', '__artist_name')
 
     def __init__(self, track_id: str, title: str, album: Album, artists: list[Artist], added_at: datetime = None):
         self.id = track_id
-        self.url = f"https://open.spotify.com/track/{self.id}"
         self.title = title
         self.album = album
         self.artists = artists
         self.added_at = added_at
+        self.__url = None
+        self.__artist_name = None
+
+    @property
+    def url(self) -> str:
+        """The Spotify url of the track, built on first access unless another url was set."""
+        return self.__url if self.__url is not None else f"https://open.spotify.com/track/{self.id}"
+
+    @url.setter
+    def url(self, url: str):
+        self.__url = url
 
     def get_artist_name(self) -> str:
-        artist_names = []
-        for artist in self.artists:
-            artist_names.append(artist.name)
-        return ", ".join(artist_names)
+        """The names of the artists joined by a comma, built once as the artists of a track do not change."""
+        if self.__artist_name is None:
+            self.__artist_name = ", ".join(artist.name for artist in self.artists)
+        return self.__artist_name
 
     def __repr__(self):
         return f"<Track(id={self.id}, title={self.title}, album={self.album}, artists={self.get_artist_name()})>"
@@ -31,21 +43,28 @@ class Track:
 
 class TrackDAO:
 
-    def __init__(self, connection: PooledMySQLConnection | MySQLConnectionAbstract, album_dao: AlbumDAO, artist_dao: ArtistDAO):
+    def __init__(self, connection: PooledMySQLConnection | MySQLConnectionAbstract, album_dao: AlbumDAO, artist_dao: ArtistDAO,
+                 identity_map: IdentityMap = None):
         """
         Initialize the DAO with a database connection and related DAOs.
         :param connection: A MySQL database connection object.
         :param album_dao: Instance of AlbumDAO to handle album-related operations.
+        :param identity_map: The identity map of the unit of work, defaults to the one of the ArtistDAO.
         """
         self.artist_dao = artist_dao
         self.connection = connection
         self.album_dao = album_dao
+        self.identity_map = identity_map if identity_map is not None else artist_dao.identity_map
 
     def put_instance(self, track: Track):
         """
         Inserts or updates a track and its related album/artist in the database.
         :param track: A Track object containing the track data.
         """
+        # Tracks are never updated, so a stored track needs no round trip at all
+        if self.identity_map.is_stored('track', track.id):
+            return
+
         try:
             cursor = self.connection.cursor()
 
@@ -77,10 +96,57 @@ class TrackDAO:
 
             # Commit the transaction
             self.connection.commit()
+            self.identity_map.commit()
+            self.identity_map.mark_stored('track', track.id)
 
         except Exception as e:
             print(f"Error: {e}")
             self.connection.rollback()
+            self.identity_map.rollback()
+        finally:
+            cursor.close()
+
+    def put_instances(self, tracks: list[Track]):
+        """
+        Inserts multiple tracks and their related albums/artists using batched multi-row statements.
+        Every artist, album, track and artist_track link is deduplicated in memory first, so each row is written once.
+        Does not commit, the caller is in charge of the transaction.
+        :param tracks: The Track objects to store.
+        """
+        unique_tracks = [
+            track for track in {track.id: track for track in tracks}.values()
+            if not self.identity_map.is_stored('track', track.id)
+        ]
+        if not unique_tracks:
+            return
+
+        # Ensure the albums and artists exist
+        self.album_dao.put_instances([track.album for track in unique_tracks])
+        self.artist_dao.put_instances([artist for track in unique_tracks for artist in track.artists])
+
+        links = list({(artist.id, track.id) for track in unique_tracks for artist in track.artists})
+
+        cursor = self.connection.cursor()
+        try:
+            insert_query = """
+            INSERT INTO track (id, title, album_id)
+            VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE id = id
+            """
+            for batch in utilities.chunked(unique_tracks):
+                cursor.executemany(insert_query, [(track.id, track.title, track.album.id) for track in batch])
+
+            # Link the artists to the tracks
+            relationship_query = """
+            INSERT INTO artist_track (artist_id, track_id)
+            VALUES (%s, %s)
+            ON DUPLICATE KEY UPDATE artist_id = artist_id
+            """
+            for batch in utilities.chunked(links):
+                cursor.executemany(relationship_query, batch)
+
+            for track in unique_tracks:
+                self.identity_map.mark_stored('track', track.id, pending = True)
         finally:
             cursor.close()
 
@@ -90,6 +156,10 @@ class TrackDAO:
         :param track_id: The ID of the track to retrieve.
         :return: A Track instance, or None if not found.
         """
+        track = self.identity_map.get('track', track_id)
+        if track:
+            return track
+
         try:
             cursor = self.connection.cursor(dictionary = True)
 
@@ -117,22 +187,99 @@ class TrackDAO:
 
             # Construct artists
             artist_instances = [
-                Artist(
+                Artist.intern(
                     artist_id = artist["id"],
                     name = artist["name"]
                 ) for artist in artists
             ]
 
             # Construct and return the Track instance
-            return Track(
+            track = Track(
                 track_id = track_data["id"],
                 title = track_data["title"],
                 album = self.album_dao.get_instance(track_data["album_id"]),
                 artists = artist_instances
             )
+            self.identity_map.add('track', track.id, track)
+            return track
 
         except Exception as e:
             print(f"Error fetching album instance: {e}")
             return None
         finally:
             cursor.close()
+
+    def get_instances(self, track_ids: list[str]) -> dict[str, Track]:
+        """
+        Retrieves multiple Track instances, including their album and artists, in a fixed amount of queries per batch.
+        Albums and artists that appear on multiple tracks are shared between the Track instances.
+        Tracks loaded earlier in the unit of work are not fetched again.
+        :param track_ids: The IDs of the tracks to retrieve, duplicates are only fetched once.
+        :return: A dict of the found Track instances by their ID.
+        """
+        tracks = {}
+        unique_track_ids = []
+        for track_id in dict.fromkeys(track_ids):
+            track = self.identity_map.get('track', track_id)
+            if track:
+                tracks[track_id] = track
+            else:
+                unique_track_ids.append(track_id)
+
+        albums = {}
+        artists = {}
+        track_artists = {}
+
+        cursor = self.connection.cursor(dictionary = True)
+        try:
+            for batch in utilities.chunked(unique_track_ids):
+                placeholders = ", ".join(["%s"] * len(batch))
+
+                # Fetch track and album data
+                query = f"""
+                SELECT t.id, t.title, t.album_id, al.title AS album_title, al.release_year
+                FROM track t
+                INNER JOIN album al ON al.id = t.album_id
+                WHERE t.id IN ({placeholders})
+                """
+                cursor.execute(query, tuple(batch))
+                track_rows = cursor.fetchall()
+
+                # Fetch associated artists
+                query = f"""
+                SELECT at.track_id, ar.id, ar.name
+                FROM artist ar
+                INNER JOIN artist_track at ON ar.id = at.artist_id
+                WHERE at.track_id IN ({placeholders})
+                """
+                cursor.execute(query, tuple(batch))
+                for artist_row in cursor.fetchall():
+                    if artist_row["id"] not in artists:
+                        artists[artist_row["id"]] = self.identity_map.get('artist', artist_row["id"]) or Artist(
+                            artist_id = artist_row["id"],
+                            name = artist_row["name"]
+                        )
+                        self.identity_map.add('artist', artist_row["id"], artists[artist_row["id"]])
+                    track_artists.setdefault(artist_row["track_id"], []).append(artists[artist_row["id"]])
+
+                # Construct the Track instances
+                for track_row in track_rows:
+                    if track_row["album_id"] not in albums:
+                        albums[track_row["album_id"]] = self.identity_map.get('album', track_row["album_id"]) or Album(
+                            album_id = track_row["album_id"],
+                            title = track_row["album_title"],
+                            release_year = track_row["release_year"]
+                        )
+                        self.identity_map.add('album', track_row["album_id"], albums[track_row["album_id"]])
+
+                    tracks[track_row["id"]] = Track(
+                        track_id = track_row["id"],
+                        title = track_row["title"],
+                        album = albums[track_row["album_id"]],
+                        artists = track_artists.get(track_row["id"], [])
+                    )
+                    self.identity_map.add('track', track_row["id"], tracks[track_row["id"]])
+        finally:
+            cursor.close()
+
+        return tracks
@@ -7,6 +7,8 @@ from datetime import datetime
 
 
 class User:
+    __slots__ = ('id', 'name', 'profile_picture_image_url', 'last_login', 'registry_date')
+
     def __init__(self, id: str, name: str, profile_picture_image_url: str | None, last_login: datetime, registry_date: datetime):
         self.id = id
         self.name = name
@@ -14,6 +16,10 @@ class User:
         self.last_login = last_login
         self.registry_date = registry_date
 
+    def export_attributes(self) -> dict:
+        """The constructor arguments of the user, e.g. to keep the user in the session."""
+        return {attribute: getattr(self, attribute) for attribute in User.__slots__}
+
     def __repr__(self):
         return (f"<User(id={self.id}, name={self.name}, profile_picture_image_url={self.profile_picture_image_url}, "
                 f"last_used={self.last_login}, registry_date={self.registry_date})>")
@@ -1,7 +1,7 @@
 import re
-import requests
 from bs4 import BeautifulSoup
 from spotify.exceptions import URLError
+from spotify.api.client import get_client
 
 
 def extract_spotify_type_id(link):
@@ -25,8 +25,18 @@ def build_soup(url: str) -> BeautifulSoup:
         "Upgrade-Insecure-Requests": "1",
     }
 
-    response = requests.get(url, headers = headers)
+    response = get_client().get(url, headers = headers)
     if response.status_code != 200:
         raise RuntimeError("Failed to retrieve track page")
 
     return BeautifulSoup(response.text, "html.parser")
+
+
+# Maximum amount of rows written per multi-row statement
+BATCH_SIZE = 500
+
+
+def chunked(items: list, size: int = BATCH_SIZE):
+    """Yields consecutive slices of at most size items."""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
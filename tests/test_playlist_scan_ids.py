@@ -0,0 +1,108 @@
+"""
+Stores scans from many threads through fake connections and checks every scan got its own id, without looking the id
+up afterward. Needs no database:
+
+    python -m unittest tests.test_playlist_scan_ids
+"""
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from unittest import mock
+
+from spotify.playlist import Playlist
+from spotify.playlist_scan import PlaylistScan, PlaylistScanDAO
+from spotify.user import User
+
+# Statements that would look up the id of a scan after inserting it
+ID_LOOKUPS = ("LAST_INSERT_ID", "MAX(ID)", "ORDER BY TIMESTAMP", "ORDER BY PS.TIMESTAMP")
+
+
+class FakeCursor:
+    def __init__(self, connection: 'FakeConnection'):
+        self.connection = connection
+
+    def execute(self, query: str, params: tuple = None):
+        self.connection.statements.append((" ".join(query.split()), params))
+
+    def executemany(self, query: str, params: list):
+        self.connection.statements.append((" ".join(query.split()), params))
+
+    def fetchone(self):
+        return None
+
+    def fetchall(self):
+        return []
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """Records the statements of its cursors, every query finds no rows."""
+    def __init__(self):
+        self.statements = []
+        self.commits = 0
+
+    def cursor(self, dictionary: bool = False) -> FakeCursor:
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+
+class TestPlaylistScanIds(unittest.TestCase):
+    threads = 16
+    scans_per_thread = 25
+
+    def store_scans(self, thread_index: int, start: threading.Barrier) -> tuple[FakeConnection, list]:
+        """Stores the scans of one thread through its own connection, like a Celery worker would."""
+        connection = FakeConnection()
+        playlist_scan_dao = PlaylistScanDAO(connection, mock.MagicMock(), mock.MagicMock(), mock.MagicMock())
+        playlist = Playlist(f"playlist_{thread_index}", f"Playlist {thread_index}", "https://example.com/cover.png")
+        user = User("user", "Test", None, datetime.now(), datetime.now())
+
+        # Let all threads start at the same moment
+        start.wait()
+        stored = []
+        for _ in range(self.scans_per_thread):
+            playlist_scan = PlaylistScan(playlist = playlist, requested_by_user = user, export_completed = False,
+                                         tracks = [])
+            stored.append((playlist_scan, playlist_scan_dao.put_instance(playlist_scan)))
+        return connection, stored
+
+    def test_concurrent_put_instance_returns_distinct_ids(self):
+        start = threading.Barrier(self.threads)
+        with ThreadPoolExecutor(max_workers = self.threads) as executor:
+            futures = [executor.submit(self.store_scans, i, start) for i in range(self.threads)]
+            results = [future.result() for future in futures]
+
+        scan_ids = [scan_id for _, stored in results for _, scan_id in stored]
+        self.assertEqual(len(scan_ids), self.threads * self.scans_per_thread)
+        self.assertNotIn(None, scan_ids)
+        self.assertEqual(len(set(scan_ids)), len(scan_ids))
+
+        for connection, stored in results:
+            self.assertEqual(connection.commits, self.scans_per_thread)
+
+            # Every scan is inserted under the id put_instance returned
+            inserted_ids = [params[0] for query, params in connection.statements
+                            if query.startswith("INSERT INTO playlist_scan (")]
+            self.assertEqual(inserted_ids, [scan_id for _, scan_id in stored])
+            for playlist_scan, scan_id in stored:
+                self.assertEqual(playlist_scan.id, scan_id)
+
+            # The id is known before the insert, nothing looks it up afterward
+            for query, _ in connection.statements:
+                for lookup in ID_LOOKUPS:
+                    self.assertNotIn(lookup, query.upper())
+
+    def test_no_latest_id_lookup(self):
+        self.assertFalse(hasattr(PlaylistScanDAO, 'get_latest_id'))
+
+
+if __name__ == "__main__":
+    unittest.main()